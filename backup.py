@@ -0,0 +1,152 @@
+"""Снимок базы для аналитики и резервные копии без остановки бота.
+
+SnapshotManager периодически копирует рабочую базу онлайн-бэкапом SQLite
+(sqlite3.Connection.backup) небольшими порциями страниц с паузами между ними.
+Копирование идет внутри читающей транзакции: в режиме WAL она не мешает
+записи, а бэкап видит согласованное состояние базы на ее начало и не
+перезапускается из-за новых записей. Готовая копия атомарно заменяет снимок,
+из которого читают выгрузки и запросы администратора
+(DatabaseManager(..., read_only=True), utils.Analytics(..., read_only=True)).
+Каждый backup_every-й снимок дополнительно сохраняется в backup_dir
+с отметкой времени; старые копии сверх backup_keep удаляются
+(при backup_keep <= 0 хранятся все).
+
+Ручной запуск:
+    python backup.py car_sales_bot.db car_sales_bot.snapshot.db --backup-dir backups
+"""
+import argparse
+import glob
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotManager:
+    """Периодически обновляемая копия базы только для чтения"""
+
+    def __init__(self, db_path: str, snapshot_path: str, interval: float = 300,
+                 pages_per_step: int = 256, step_sleep: float = 0.005,
+                 backup_dir: Optional[str] = None, backup_every: int = 1, backup_keep: int = 24):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.backup_dir = backup_dir
+        self.backup_every = backup_every
+        self.backup_keep = backup_keep
+
+        self.refreshed_at: Optional[datetime] = None
+        self.last_duration = 0.0
+        self._refreshes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> str:
+        """Обновление снимка; возвращает путь к нему"""
+        started = time.perf_counter()
+        tmp_path = f"{self.snapshot_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        # isolation_level=None: транзакцией управляем сами
+        source = sqlite3.connect(self.db_path, isolation_level=None)
+        target = sqlite3.connect(tmp_path)
+        try:
+            # Чтение фиксирует состояние базы до конца транзакции
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            # sleep у backup() действует только при занятой базе, поэтому паузу между порциями
+            # делает progress: он вызывается после каждого шага
+            source.backup(target, pages=self.pages_per_step, progress=self._pause)
+            source.execute("COMMIT")
+
+            # Копия наследует режим WAL; снимку он не нужен, а без -wal/-shm его проще открывать только на чтение
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.close()
+
+        # Уже открытые соединения дочитывают прежний файл, новые открывают свежий
+        os.replace(tmp_path, self.snapshot_path)
+
+        self.refreshed_at = datetime.now()
+        self.last_duration = time.perf_counter() - started
+        self._refreshes += 1
+        logger.info(f"Снимок {self.snapshot_path} обновлен за {self.last_duration:.2f} с")
+
+        if self.backup_dir and self._refreshes % self.backup_every == 0:
+            self._save_backup()
+        return self.snapshot_path
+
+    def _pause(self, status: int, remaining: int, total: int):
+        if remaining and self.step_sleep:
+            time.sleep(self.step_sleep)
+
+    def _backup_pattern(self) -> str:
+        name = os.path.splitext(os.path.basename(self.db_path))[0]
+        return os.path.join(self.backup_dir, f"{name}_*.db")
+
+    def _save_backup(self):
+        """Копия снимка на момент обновления и удаление устаревших копий"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        # Микросекунды в имени: снимки, сделанные в одну секунду, не затирают друг друга
+        filename = self._backup_pattern().replace("*", self.refreshed_at.strftime('%Y%m%d_%H%M%S_%f'))
+        # Снимок больше не меняется, поэтому обычное копирование файла безопасно
+        shutil.copyfile(self.snapshot_path, filename)
+
+        # backup_keep <= 0 - хранить все копии
+        if self.backup_keep > 0:
+            for old in self.list_backups()[:-self.backup_keep]:
+                os.remove(old)
+
+    def list_backups(self) -> List[str]:
+        """Резервные копии от старых к новым"""
+        if not self.backup_dir:
+            return []
+        return sorted(glob.glob(self._backup_pattern()))
+
+    def start(self):
+        """Обновление снимка в фоновом потоке каждые interval секунд"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except (sqlite3.Error, OSError) as e:
+                # Снимок остается прежним, следующая попытка - через interval
+                logger.error(f"Ошибка обновления снимка {self.snapshot_path}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Снимок и резервная копия базы бота")
+    parser.add_argument("db_path")
+    parser.add_argument("snapshot_path")
+    parser.add_argument("--backup-dir")
+    parser.add_argument("--keep", type=int, default=24, help="Сколько копий хранить, 0 - все")
+    args = parser.parse_args()
+
+    manager = SnapshotManager(args.db_path, args.snapshot_path, backup_dir=args.backup_dir, backup_keep=args.keep)
+    manager.refresh()
+    print(f"Снимок: {args.snapshot_path} ({manager.last_duration:.2f} с)")
+    for path in manager.list_backups():
+        print(f"Резервная копия: {path}")
+
+
+if __name__ == "__main__":
+    main()
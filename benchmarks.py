@@ -0,0 +1,203 @@
+"""Микробенчмарки слоя данных.
+
+Замеряет задержку и память операций DatabaseManager, utils.Analytics,
+RegionManager и PDFGenerator на базе из dataset_generator.py.
+Результаты сохраняются в JSON, дописываются в историю и сравниваются с базовым прогоном.
+
+Пример запуска:
+    python benchmarks.py --users 10000 --messages 1000000 --output bench.json
+    python benchmarks.py --db bench.db --baseline bench.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from database import DatabaseManager
+from dataset_generator import FIRST_USER_ID, REGIONS, DatasetGenerator
+from pdf_generator import PDFGenerator
+from utils import Analytics, RegionManager
+
+# Запросы администратора к /search: частые и редкие слова, несколько слов сразу
+SEARCH_QUERIES = ["kia", "кредит", "пробегом", "toyota кредит", "бюджет посоветуете"]
+
+SAMPLE_ANALYSIS = {
+    'telegram_channels': ["@auto_region", "@cars_sale"],
+    'chat_groups': ["Авторынок региона"],
+    'estimated_clients': 1500,
+}
+
+
+class Benchmark:
+    """Набор операций с замером задержки и пиковой памяти"""
+
+    def __init__(self, db_path: str, work_dir: str, users: int, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.next_user_id = FIRST_USER_ID + users + 1
+
+        self.db = DatabaseManager(db_path)
+        self.analytics = Analytics(db_path)
+        self.region_manager = RegionManager(db_path)
+        self.pdf_gen = PDFGenerator(os.path.join(work_dir, "offers"))
+
+    def _existing_user(self) -> int:
+        return FIRST_USER_ID + self.rng.randrange(self.users)
+
+    def _new_user(self) -> int:
+        self.next_user_id += 1
+        return self.next_user_id
+
+    def operations(self) -> Dict[str, Callable[[], object]]:
+        """Операции бенчмарка. Каждая вызывается без аргументов"""
+        db = self.db
+        return {
+            'db.add_user': lambda: db.add_user(self._new_user(), "bench", "Бенч", ""),
+            'db.log_message': lambda: db.log_message(self._existing_user(), "Интересует Kia", "text"),
+            'db.log_interest': lambda: db.log_interest(self._existing_user(), "car_interest", "Бенч"),
+            'db.log_offer_sent': lambda: db.log_offer_sent(self._new_user(), "car_offer", "car_offer.pdf"),
+            'db.has_received_offer': lambda: db.has_received_offer(self._existing_user()),
+            'db.update_user_region': lambda: db.update_user_region(self._existing_user(), self.rng.choice(REGIONS)),
+            'db.get_user_messages': lambda: db.get_user_messages(self._existing_user()),
+            'db.get_user_interests': lambda: db.get_user_interests(self._existing_user()),
+            'db.get_top_leads': lambda: db.get_top_leads(self.rng.choice(REGIONS + [None]), 10),
+            'db.search_messages': lambda: db.search_messages(self.rng.choice(SEARCH_QUERIES), 10),
+            'analytics.get_regional_stats': self.analytics.get_regional_stats,
+            'analytics.get_offer_stats': self.analytics.get_offer_stats,
+            'regions.add_region_analysis': lambda: self.region_manager.add_region_analysis(
+                self.rng.choice(REGIONS), SAMPLE_ANALYSIS
+            ),
+            'pdf.generate_offer': self._generate_offer,
+        }
+
+    def _generate_offer(self):
+        user_id = self._existing_user()
+        return self.pdf_gen.generate_offer(
+            user_id, self.db.get_user_messages(user_id), self.db.get_user_interests(user_id)
+        )
+
+    def measure(self, operation: Callable[[], object], iterations: int, warmup: int = 2) -> Dict:
+        for _ in range(warmup):
+            operation()
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            operation()
+            timings.append(time.perf_counter() - started)
+
+        # Память замеряем отдельным вызовом: tracemalloc искажает время
+        tracemalloc.start()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'iterations': iterations,
+            'mean_ms': statistics.fmean(timings) * 1000,
+            'p50_ms': timings[len(timings) // 2] * 1000,
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+            'min_ms': timings[0] * 1000,
+            'peak_memory_kb': peak / 1024,
+        }
+
+    def run(self, iterations: int, only: Optional[List[str]] = None) -> Dict[str, Dict]:
+        results = {}
+        for name, operation in self.operations().items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            # Агрегаты по всей базе и рендер PDF на порядки дороже точечных запросов
+            count = max(3, iterations // 20) if name.startswith(('analytics.', 'pdf.')) else iterations
+            results[name] = self.measure(operation, count)
+            print(f"{name:<32}{results[name]['p50_ms']:>10.3f} мс  p95 {results[name]['p95_ms']:>10.3f} мс  "
+                  f"память {results[name]['peak_memory_kb']:>8.1f} КБ")
+        return results
+
+
+def compare_with_baseline(results: Dict[str, Dict], baseline: Dict, threshold: float) -> List[str]:
+    """Сравнение медиан с базовым прогоном. Возвращает список регрессий"""
+    regressions = []
+    print()
+    print(f"{'Операция':<32}{'база, мс':>12}{'сейчас, мс':>12}{'отношение':>12}")
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous['p50_ms']:
+            continue
+        ratio = current['p50_ms'] / previous['p50_ms']
+        mark = "  <-- регрессия" if ratio > threshold else ""
+        print(f"{name:<32}{previous['p50_ms']:>12.3f}{current['p50_ms']:>12.3f}{ratio:>12.2f}{mark}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Микробенчмарки слоя данных")
+    parser.add_argument("--db", help="Готовая база (иначе генерируется во временном каталоге)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--interests", type=int, default=30_000)
+    parser.add_argument("--offers", type=int, default=3_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--only", nargs="*", help="Префиксы операций, например db. analytics.")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--history", help="Дописать результаты строкой JSON в файл истории")
+    parser.add_argument("--baseline", help="JSON базового прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Допустимое замедление медианы")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix="carsales_bench_")
+
+    dataset = {'users': args.users, 'messages': args.messages, 'interests': args.interests,
+               'offers': args.offers, 'seed': args.seed}
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(work_dir, "bench.db")
+        started = time.perf_counter()
+        DatasetGenerator(db_path, seed=args.seed).generate(
+            args.users, args.messages, args.interests, args.offers
+        )
+        print(f"База сгенерирована за {time.perf_counter() - started:.1f} с: {db_path}")
+
+    benchmark = Benchmark(db_path, work_dir, args.users, seed=args.seed)
+    results = benchmark.run(args.iterations, args.only)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'dataset': dataset,
+        'db_size_bytes': os.path.getsize(db_path),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.history:
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nРегрессии: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
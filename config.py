@@ -12,6 +12,67 @@ ADMIN_IDS = [5533990703]  # Замените на реальные ID
 # Настройки базы данных
 DB_PATH = "car_sales_bot.db"
 
+# Снимок базы для выгрузок и запросов администратора (backup.py): обновляется онлайн-бэкапом
+# порциями по SNAPSHOT_PAGES_PER_STEP страниц с паузой SNAPSHOT_STEP_SLEEP секунд,
+# поэтому отчеты видят данные с отставанием до SNAPSHOT_INTERVAL секунд
+SNAPSHOT_PATH = "car_sales_bot.snapshot.db"
+SNAPSHOT_INTERVAL = 300
+SNAPSHOT_PAGES_PER_STEP = 256
+SNAPSHOT_STEP_SLEEP = 0.005
+
+# Резервные копии: каждый BACKUP_EVERY-й снимок сохраняется в BACKUP_DIR, хранятся последние BACKUP_KEEP
+# (0 - хранить все)
+BACKUP_DIR = "backups"
+BACKUP_EVERY = 12
+BACKUP_KEEP = 48
+
+# Интервал записи состояний пользователей (context.user_data) в базу, секунды
+PERSISTENCE_UPDATE_INTERVAL = 30
+
+# Минимальный интервал между правками сообщения при потоковом анализе региона, секунды
+# (Telegram ограничивает частоту edit_text в одном чате)
+STREAM_EDIT_INTERVAL = 1.0
+
+# Сколько нераспознанных вводов региона подряд допускается, прежде чем бот вернет пользователя в меню
+REGION_INPUT_ATTEMPTS = 2
+
+# Антифлуд (throttling.py): пополнение токенов в секунду и емкость ведра - на пользователя и общие.
+# В многопроцессном режиме общее ведро у каждого процесса свое
+THROTTLE_USER_RATE = 0.5
+THROTTLE_USER_BURST = 20
+THROTTLE_GLOBAL_RATE = 300
+THROTTLE_GLOBAL_BURST = 1000
+# Стоимость действий в токенах; остальные действия стоят 1
+THROTTLE_COSTS = {
+    "region_analysis": 10,  # запрос к OpenAI; списывается только за распознанный регион
+    "get_offer": 5,  # генерация PDF
+    "export_excel": 10,
+}
+# Предупреждение "подождите" на отсеченные сообщения: не чаще раза в интервал (с) на пользователя
+# и не больше THROTTLE_NOTICE_GLOBAL_RATE в секунду на всех
+THROTTLE_NOTICE_INTERVAL = 30
+THROTTLE_NOTICE_GLOBAL_RATE = 10
+
+# Количество результатов на странице поиска по сообщениям (/search)
+SEARCH_PAGE_SIZE = 10
+
+# Количество клиентов в списке /leads
+TOP_LEADS_LIMIT = 10
+
+# Многопроцессный режим (sharding.py): число процессов-обработчиков и параметры вебхука.
+# Каждый процесс пишет в свой файл базы, см. database.shard_db_path
+WORKER_COUNT = 4
+WEBHOOK_URL = "https://example.com"
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_SECRET_TOKEN = ""
+
+# Профилирование по команде /profile: интервал семплирования и длительность окна, секунды
+PROFILE_SAMPLE_INTERVAL = 0.01
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+
 # Настройки экспорта
 EXPORT_DIR = "exports"
 
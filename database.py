@@ -1,15 +1,112 @@
 # database.py
+import heapq
+import os
+import pathlib
+import re
 import sqlite3
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from lead_scoring import LeadScorer
+
 logger = logging.getLogger(__name__)
 
+# Окончания, которые отбрасываются у слов поискового запроса (самые длинные проверяются первыми)
+RUSSIAN_ENDINGS = (
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ом', 'ем', 'ах', 'ях', 'ов', 'ев', 'ам', 'ям',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+)
+
+# Полнотекстовый индекс по текстовым сообщениям. Индекс внешний (content=user_messages),
+# сам текст не дублируется; ё приводится к е, так как unicode61 их не отождествляет
+MESSAGE_SEARCH_SQL = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS user_messages_fts USING fts5(
+        message_text,
+        content='user_messages',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS user_messages_fts_insert AFTER INSERT ON user_messages
+    WHEN new.message_type = 'text'
+    BEGIN
+        INSERT INTO user_messages_fts (rowid, message_text)
+        VALUES (new.id, replace(replace(new.message_text, 'ё', 'е'), 'Ё', 'Е'));
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS user_messages_fts_delete AFTER DELETE ON user_messages
+    WHEN old.message_type = 'text'
+    BEGIN
+        INSERT INTO user_messages_fts (user_messages_fts, rowid, message_text)
+        VALUES ('delete', old.id, replace(replace(old.message_text, 'ё', 'е'), 'Ё', 'Е'));
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS user_messages_fts_update AFTER UPDATE ON user_messages
+    BEGIN
+        INSERT INTO user_messages_fts (user_messages_fts, rowid, message_text)
+        SELECT 'delete', old.id, replace(replace(old.message_text, 'ё', 'е'), 'Ё', 'Е')
+        WHERE old.message_type = 'text';
+        INSERT INTO user_messages_fts (rowid, message_text)
+        SELECT new.id, replace(replace(new.message_text, 'ё', 'е'), 'Ё', 'Е')
+        WHERE new.message_type = 'text';
+    END
+    '''
+]
+
+
+def build_search_query(text: str) -> Optional[str]:
+    """Преобразование текста администратора в запрос FTS5.
+
+    Каждое слово ищется по префиксу без окончания: "москве" -> "москв"*,
+    поэтому находятся и другие падежи. Слова объединяются через И.
+    """
+    terms = []
+    for word in re.findall(r'\w+', text.lower().replace('ё', 'е')):
+        if len(word) > 3:
+            for ending in RUSSIAN_ENDINGS:
+                if word.endswith(ending) and len(word) - len(ending) >= 3:
+                    word = word[:-len(ending)]
+                    break
+        terms.append(f'"{word}"*')
+
+    return " ".join(terms) if terms else None
+
+def connect_read_only(db_path: str) -> sqlite3.Connection:
+    """Соединение, которое не может изменить базу и не создает файл, если его нет"""
+    return sqlite3.connect(f"{pathlib.Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+
+
+def shard_db_path(db_path: str, shard: int) -> str:
+    """Путь к файлу шарда: car_sales_bot.db -> car_sales_bot.shard0.db"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.shard{shard}{ext}"
+
+
+def shard_for_user(user_id: int, shard_count: int) -> int:
+    """Номер шарда пользователя. Одинаков во всех процессах, в отличие от hash() для строк"""
+    return user_id % shard_count
+
+
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, scorer: Optional[LeadScorer] = None, read_only: bool = False):
         self.db_path = db_path
-        self.init_database()
+        self.scorer = scorer or LeadScorer()
+        # Только чтение - для снимка базы (backup.SnapshotManager): таблицы уже созданы в рабочей базе
+        self.read_only = read_only
+        if not read_only:
+            self.init_database()
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            return connect_read_only(self.db_path)
+        return sqlite3.connect(self.db_path)
     
     def init_database(self):
         """Инициализация всех таблиц базы данных"""
@@ -82,23 +179,59 @@ class DatabaseManager:
             '''
         ]
         
-        conn = sqlite3.connect(self.db_path)
+        indexes = [
+            # Топ клиентов по баллу: в целом и по региону
+            "CREATE INDEX IF NOT EXISTS idx_users_interest_level ON users (interest_level DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_users_region_interest_level ON users (region, interest_level DESC)"
+        ]
+        
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # WAL: чтение (в том числе онлайн-бэкап для снимка) не блокирует запись
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         for table_sql in tables:
             cursor.execute(table_sql)
         
+        for index_sql in indexes:
+            cursor.execute(index_sql)
+        
+        self._init_message_search(cursor)
+        
         conn.commit()
         conn.close()
     
+    def _init_message_search(self, cursor):
+        """Создание полнотекстового индекса сообщений и заполнение его по уже накопленным данным"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'user_messages_fts'")
+        index_exists = cursor.fetchone() is not None
+        
+        for sql in MESSAGE_SEARCH_SQL:
+            cursor.execute(sql)
+        
+        if not index_exists:
+            cursor.execute('''
+                INSERT INTO user_messages_fts (rowid, message_text)
+                SELECT id, replace(replace(message_text, 'ё', 'е'), 'Ё', 'Е')
+                FROM user_messages
+                WHERE message_type = 'text'
+            ''')
+    
     def add_user(self, user_id: int, username: str, first_name: str, last_name: str = ""):
         """Добавление нового пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # Обновляем только анкетные поля, чтобы не сбросить регион и балл при повторном /start
         cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, first_name, last_name, last_contact)
+            INSERT INTO users (user_id, username, first_name, last_name, last_contact)
             VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                last_contact = excluded.last_contact
         ''', (user_id, username, first_name, last_name))
         
         conn.commit()
@@ -106,33 +239,44 @@ class DatabaseManager:
     
     def log_message(self, user_id: int, message_text: str, message_type: str = "text"):
         """Логирование сообщения пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
             INSERT INTO user_messages (user_id, message_text, message_type)
             VALUES (?, ?, ?)
         ''', (user_id, message_text, message_type))
+        self._add_score(cursor, user_id, self.scorer.message_weight(message_type))
         
         conn.commit()
         conn.close()
     
     def log_interest(self, user_id: int, interest_type: str, details: str = ""):
         """Логирование интереса пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        weight = self.scorer.interest_weight(interest_type)
         cursor.execute('''
-            INSERT INTO user_interests (user_id, interest_type, interest_details)
-            VALUES (?, ?, ?)
-        ''', (user_id, interest_type, details))
+            INSERT INTO user_interests (user_id, interest_type, interest_details, interest_level)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, interest_type, details, weight))
+        self._add_score(cursor, user_id, weight)
         
         conn.commit()
         conn.close()
     
+    def _add_score(self, cursor, user_id: int, weight: int):
+        """Инкрементальное обновление балла пользователя"""
+        if weight:
+            cursor.execute(
+                "UPDATE users SET interest_level = interest_level + ? WHERE user_id = ?",
+                (weight, user_id)
+            )
+    
     def log_offer_sent(self, user_id: int, offer_type: str, file_path: str = ""):
         """Логирование отправки предложения"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -145,7 +289,7 @@ class DatabaseManager:
     
     def has_received_offer(self, user_id: int) -> bool:
         """Проверка, получал ли пользователь предложение"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute("SELECT 1 FROM sent_offers WHERE user_id = ?", (user_id,))
@@ -156,7 +300,7 @@ class DatabaseManager:
     
     def update_user_region(self, user_id: int, region: str):
         """Обновление региона пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -169,7 +313,7 @@ class DatabaseManager:
     
     def get_user_messages(self, user_id: int) -> List[Dict]:
         """Получение истории сообщений пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -192,7 +336,7 @@ class DatabaseManager:
     
     def get_user_interests(self, user_id: int) -> List[Dict]:
         """Получение интересов пользователя"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -212,3 +356,127 @@ class DatabaseManager:
         
         conn.close()
         return interests
+    
+    def search_messages(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Полнотекстовый поиск по сообщениям пользователей, новые сообщения первыми"""
+        match_query = build_search_query(query)
+        if not match_query:
+            return []
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT m.user_id, u.username, u.first_name, u.region, m.message_text, m.timestamp
+            FROM user_messages_fts f
+            JOIN user_messages m ON m.id = f.rowid
+            LEFT JOIN users u ON u.user_id = m.user_id
+            WHERE user_messages_fts MATCH ?
+            ORDER BY f.rowid DESC
+            LIMIT ? OFFSET ?
+        ''', (match_query, limit, offset))
+        
+        results = []
+        for row in cursor.fetchall():
+            results.append({
+                'user_id': row[0],
+                'username': row[1],
+                'first_name': row[2],
+                'region': row[3],
+                'text': row[4],
+                'timestamp': row[5]
+            })
+        
+        conn.close()
+        return results
+    
+    def get_top_leads(self, region: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """Самые заинтересованные клиенты, в целом или по региону"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        if region:
+            cursor.execute('''
+                SELECT user_id, username, first_name, region, interest_level, last_contact
+                FROM users
+                WHERE region = ? AND interest_level > 0
+                ORDER BY interest_level DESC
+                LIMIT ?
+            ''', (region, limit))
+        else:
+            cursor.execute('''
+                SELECT user_id, username, first_name, region, interest_level, last_contact
+                FROM users
+                WHERE interest_level > 0
+                ORDER BY interest_level DESC
+                LIMIT ?
+            ''', (limit,))
+        
+        leads = []
+        for row in cursor.fetchall():
+            leads.append({
+                'user_id': row[0],
+                'username': row[1],
+                'first_name': row[2],
+                'region': row[3],
+                'interest_level': row[4],
+                'last_contact': row[5]
+            })
+        
+        conn.close()
+        return leads
+
+
+class ShardedDatabaseManager:
+    """Набор баз-шардов с тем же интерфейсом, что у DatabaseManager.
+
+    Данные пользователя целиком лежат в шарде shard_for_user(user_id), поэтому
+    операции по пользователю идут в один файл, а поиск и топ клиентов опрашивают
+    все шарды и сливают результаты.
+    """
+    
+    def __init__(self, db_path: str, shard_count: int, scorer: Optional[LeadScorer] = None,
+                 read_only: bool = False):
+        self.db_path = db_path
+        self.shard_count = shard_count
+        self.shards = [
+            DatabaseManager(shard_db_path(db_path, shard), scorer, read_only) for shard in range(shard_count)
+        ]
+    
+    def shard(self, user_id: int) -> DatabaseManager:
+        return self.shards[shard_for_user(user_id, self.shard_count)]
+    
+    def add_user(self, user_id: int, username: str, first_name: str, last_name: str = ""):
+        self.shard(user_id).add_user(user_id, username, first_name, last_name)
+    
+    def log_message(self, user_id: int, message_text: str, message_type: str = "text"):
+        self.shard(user_id).log_message(user_id, message_text, message_type)
+    
+    def log_interest(self, user_id: int, interest_type: str, details: str = ""):
+        self.shard(user_id).log_interest(user_id, interest_type, details)
+    
+    def log_offer_sent(self, user_id: int, offer_type: str, file_path: str = ""):
+        self.shard(user_id).log_offer_sent(user_id, offer_type, file_path)
+    
+    def has_received_offer(self, user_id: int) -> bool:
+        return self.shard(user_id).has_received_offer(user_id)
+    
+    def update_user_region(self, user_id: int, region: str):
+        self.shard(user_id).update_user_region(user_id, region)
+    
+    def get_user_messages(self, user_id: int) -> List[Dict]:
+        return self.shard(user_id).get_user_messages(user_id)
+    
+    def get_user_interests(self, user_id: int) -> List[Dict]:
+        return self.shard(user_id).get_user_interests(user_id)
+    
+    def search_messages(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """Поиск по всем шардам; каждый шард отдает первые offset + limit совпадений"""
+        per_shard = [shard.search_messages(query, offset + limit, 0) for shard in self.shards]
+        merged = heapq.merge(*per_shard, key=lambda item: item['timestamp'], reverse=True)
+        return list(merged)[offset:offset + limit]
+    
+    def get_top_leads(self, region: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        per_shard = [shard.get_top_leads(region, limit) for shard in self.shards]
+        merged = heapq.merge(*per_shard, key=lambda lead: lead['interest_level'], reverse=True)
+        return list(merged)[:limit]
@@ -0,0 +1,207 @@
+"""Генератор синтетических данных для базы бота.
+
+Заполняет users, user_messages, user_interests и sent_offers реалистичными
+объемами (от десятков тысяч до десятков миллионов строк) пакетными вставками.
+Генерация детерминирована: одинаковый seed дает одинаковую базу.
+
+Пример запуска:
+    python dataset_generator.py bench.db --users 100000 --messages 5000000
+"""
+import argparse
+import itertools
+import random
+import sqlite3
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from database import DatabaseManager
+from lead_scoring import LeadScorer
+
+FIRST_USER_ID = 100_000_000
+PERIOD_SECONDS = 365 * 24 * 3600
+
+REGIONS = [
+    "Москва", "Санкт-Петербург", "Краснодарский край", "Новосибирская область",
+    "Свердловская область", "Республика Татарстан", "Ростовская область",
+    "Нижегородская область", "Самарская область", "Челябинская область",
+    "Республика Башкортостан", "Пермский край", "Воронежская область", "Красноярский край",
+]
+FIRST_NAMES = ["Алексей", "Дмитрий", "Иван", "Сергей", "Андрей", "Мария", "Анна", "Елена", "Ольга", "Павел"]
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", ""]
+BRANDS = ["Toyota", "Kia", "Hyundai", "Lada", "BMW", "Mercedes", "Haval", "Chery", "Geely", "Skoda"]
+TEXT_TEMPLATES = [
+    "Интересует {brand} в {region}",
+    "Сколько стоит {brand} с пробегом?",
+    "Бюджет до {budget} млн, что посоветуете?",
+    "Есть ли {brand} в кредит?",
+    "Хочу обменять свой {brand} по trade-in",
+    "{region}",
+]
+CALLBACKS = ["interest_cars", "analyze_region", "get_offer", "interest_new", "interest_used", "interest_electric"]
+INTEREST_TYPES = [
+    ("car_interest", "Общий интерес к автомобилям"),
+    ("offer_request", "Запрос коммерческого предложения"),
+    ("region_analysis", None),
+]
+
+
+def _text_pool(rng: random.Random, size: int = 2000) -> List[Tuple[str, str]]:
+    """Заранее подготовленные пары (текст, тип), чтобы не форматировать строки на каждую запись"""
+    pool = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.6:
+            pool.append((f"Кнопка: {rng.choice(CALLBACKS)}", "callback"))
+        elif kind < 0.9:
+            text = rng.choice(TEXT_TEMPLATES).format(
+                brand=rng.choice(BRANDS), region=rng.choice(REGIONS), budget=rng.randint(1, 9)
+            )
+            pool.append((text, "text"))
+        else:
+            pool.append(("/start", "command"))
+    return pool
+
+
+def _user_weights(count: int) -> List[float]:
+    """Накопленные веса активности: немногие пользователи пишут много, большинство - мало"""
+    return list(itertools.accumulate(1.0 / (rank ** 0.8) for rank in range(1, count + 1)))
+
+
+def _chunks(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class DatasetGenerator:
+    """Пакетная генерация таблиц бота с фиксированным seed"""
+
+    def __init__(self, db_path: str, seed: int = 42, chunk_size: int = 50_000):
+        self.db_path = db_path
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.now = int(time.time())
+
+        # Схему создает DatabaseManager, чтобы она совпадала с рабочей
+        DatabaseManager(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        # Журнал и fsync не нужны для одноразовой генерации
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -200000")
+        return conn
+
+    def _insert(self, conn: sqlite3.Connection, sql: str, rows: Iterator[tuple]) -> int:
+        count = 0
+        for chunk in _chunks(rows, self.chunk_size):
+            conn.executemany(sql, chunk)
+            count += len(chunk)
+        return count
+
+    def _timestamp(self, rng: random.Random) -> int:
+        return self.now - rng.randrange(PERIOD_SECONDS)
+
+    def generate(self, users: int, messages: int, interests: int, offers: int) -> Dict[str, int]:
+        """Генерация всех таблиц. Возвращает количество вставленных строк по таблицам"""
+        rng = random.Random(self.seed)
+        user_ids = range(FIRST_USER_ID, FIRST_USER_ID + users)
+        weights = _user_weights(users)
+        texts = _text_pool(rng)
+        counts = {}
+
+        conn = self._connect()
+        try:
+            # Даты считает SQLite через datetime(?, 'unixepoch') - это быстрее strftime в Python
+            counts['users'] = self._insert(conn, '''
+                INSERT OR REPLACE INTO users
+                (user_id, username, first_name, last_name, region, last_contact, created_at)
+                VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'), datetime(?, 'unixepoch'))
+            ''', (
+                (
+                    user_id,
+                    f"user{user_id}",
+                    rng.choice(FIRST_NAMES),
+                    rng.choice(LAST_NAMES),
+                    rng.choice(REGIONS) if rng.random() < 0.7 else None,
+                    self._timestamp(rng),
+                    self._timestamp(rng),
+                )
+                for user_id in user_ids
+            ))
+
+            def message_rows():
+                remaining = messages
+                while remaining > 0:
+                    batch = min(remaining, self.chunk_size)
+                    for user_id in rng.choices(user_ids, cum_weights=weights, k=batch):
+                        text, message_type = texts[rng.randrange(len(texts))]
+                        yield user_id, text, message_type, self._timestamp(rng)
+                    remaining -= batch
+
+            counts['user_messages'] = self._insert(conn, '''
+                INSERT INTO user_messages (user_id, message_text, message_type, timestamp)
+                VALUES (?, ?, ?, datetime(?, 'unixepoch'))
+            ''', message_rows())
+
+            def interest_rows():
+                remaining = interests
+                while remaining > 0:
+                    batch = min(remaining, self.chunk_size)
+                    for user_id in rng.choices(user_ids, cum_weights=weights, k=batch):
+                        interest_type, details = rng.choice(INTEREST_TYPES)
+                        yield user_id, interest_type, details or rng.choice(REGIONS), self._timestamp(rng)
+                    remaining -= batch
+
+            counts['user_interests'] = self._insert(conn, '''
+                INSERT INTO user_interests (user_id, interest_type, interest_details, timestamp)
+                VALUES (?, ?, ?, datetime(?, 'unixepoch'))
+            ''', interest_rows())
+
+            # Предложение отправляется пользователю не больше одного раза
+            offer_users = rng.sample(user_ids, min(offers, users))
+            counts['sent_offers'] = self._insert(conn, '''
+                INSERT INTO sent_offers (user_id, offer_type, offer_file_path, sent_at)
+                VALUES (?, 'car_offer', 'car_offer.pdf', datetime(?, 'unixepoch'))
+            ''', ((user_id, self._timestamp(rng)) for user_id in offer_users))
+
+            conn.commit()
+        finally:
+            conn.close()
+
+        # Баллы считаются так же, как в рабочей базе, иначе /leads и бенчмарки видят одни нули
+        LeadScorer().rescore_all(self.db_path)
+        return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Генерация синтетической базы бота")
+    parser.add_argument("db_path", help="Путь к создаваемой базе")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--interests", type=int, default=30_000)
+    parser.add_argument("--offers", type=int, default=3_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    started = time.perf_counter()
+    generator = DatasetGenerator(args.db_path, seed=args.seed, chunk_size=args.chunk_size)
+    counts = generator.generate(args.users, args.messages, args.interests, args.offers)
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    for table, count in counts.items():
+        print(f"{table:<16}{count:>12}")
+    print(f"Всего {total} строк за {elapsed:.1f} с ({total / elapsed:.0f} строк/с)")
+
+
+if __name__ == "__main__":
+    main()
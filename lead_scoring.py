@@ -0,0 +1,114 @@
+"""Оценка заинтересованности клиентов (лид-скоринг).
+
+Балл пользователя (users.interest_level) - сумма весов его событий:
+интересов из log_interest и сообщений из log_message. DatabaseManager
+прибавляет вес каждого нового события сразу при записи (O(1) на событие),
+а rescore_all пересчитывает баллы всех пользователей пакетно - после смены весов.
+
+Пример запуска пересчета:
+    python lead_scoring.py car_sales_bot.db
+В многопроцессном режиме (sharding.py) вторым аргументом передается число шардов,
+и пересчитывается каждый файл шарда:
+    python lead_scoring.py car_sales_bot.db 4
+"""
+import sqlite3
+import sys
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Веса интересов (user_interests.interest_type)
+INTEREST_WEIGHTS = {
+    'offer_request': 30,
+    'region_analysis': 15,
+    'car_interest': 10,
+}
+
+# Веса сообщений (user_messages.message_type)
+MESSAGE_WEIGHTS = {
+    'text': 3,
+    'callback': 1,
+    'command': 1,
+}
+
+# Вес неизвестного интереса совпадает со значением по умолчанию user_interests.interest_level
+DEFAULT_INTEREST_WEIGHT = 1
+DEFAULT_MESSAGE_WEIGHT = 0
+
+
+class LeadScorer:
+    """Веса событий и пакетный пересчет баллов"""
+
+    def __init__(self, interest_weights: Optional[Dict[str, int]] = None,
+                 message_weights: Optional[Dict[str, int]] = None):
+        self.interest_weights = interest_weights if interest_weights is not None else INTEREST_WEIGHTS
+        self.message_weights = message_weights if message_weights is not None else MESSAGE_WEIGHTS
+
+    def interest_weight(self, interest_type: str) -> int:
+        return self.interest_weights.get(interest_type, DEFAULT_INTEREST_WEIGHT)
+
+    def message_weight(self, message_type: str) -> int:
+        return self.message_weights.get(message_type, DEFAULT_MESSAGE_WEIGHT)
+
+    def _weighted_counts(self, conn, sql: str, weights: Dict[str, int], default: int) -> "pd.Series":
+        """Сумма весов по пользователям из агрегата (user_id, type, count)"""
+        # pandas нужен только пакетному пересчету; бот (DatabaseManager) использует лишь веса
+        import pandas as pd
+
+        counts = pd.read_sql_query(sql, conn)
+        weight = counts['type'].map(weights).fillna(default)
+        return (counts['n'] * weight).groupby(counts['user_id']).sum()
+
+    def rescore_all(self, db_path: str) -> int:
+        """Пересчет баллов всех пользователей по текущим весам.
+
+        Возвращает количество пользователей с ненулевым баллом.
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            # Блокируем запись на время пересчета, чтобы не потерять события, пришедшие в процессе
+            conn.execute("BEGIN IMMEDIATE")
+
+            interest_scores = self._weighted_counts(conn, '''
+                SELECT user_id, interest_type AS type, COUNT(*) AS n
+                FROM user_interests GROUP BY user_id, interest_type
+            ''', self.interest_weights, DEFAULT_INTEREST_WEIGHT)
+            message_scores = self._weighted_counts(conn, '''
+                SELECT user_id, message_type AS type, COUNT(*) AS n
+                FROM user_messages GROUP BY user_id, message_type
+            ''', self.message_weights, DEFAULT_MESSAGE_WEIGHT)
+
+            scores = interest_scores.add(message_scores, fill_value=0).astype('int64')
+            scores = scores[scores != 0]
+
+            conn.execute("UPDATE users SET interest_level = 0 WHERE interest_level != 0")
+            conn.executemany(
+                "UPDATE users SET interest_level = ? WHERE user_id = ?",
+                zip(scores.tolist(), scores.index.tolist())
+            )
+
+            # Вес каждого интереса хранится и в самой записи
+            cursor = conn.execute("SELECT DISTINCT interest_type FROM user_interests")
+            conn.executemany(
+                "UPDATE user_interests SET interest_level = ? WHERE interest_type IS ?",
+                [(self.interest_weight(row[0]), row[0]) for row in cursor.fetchall()]
+            )
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        return len(scores)
+
+
+if __name__ == "__main__":
+    from database import shard_db_path
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "car_sales_bot.db"
+    shard_count = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    for db_path in [shard_db_path(path, i) for i in range(shard_count)] or [path]:
+        print(f"{db_path}: пересчитаны баллы {LeadScorer().rescore_all(db_path)} пользователей")
@@ -0,0 +1,412 @@
+"""Нагрузочное тестирование обработчиков CarSalesBot.
+
+Строит синтетические Update/CallbackQuery для реальных сценариев бота
+и прогоняет их через обработчики CarSalesBot с заданной интенсивностью.
+Telegram заменен фейковым ботом, OpenAI - потоковой заглушкой с настраиваемой задержкой.
+Если в дереве нет модуля analytics, выгрузка администратора заменяется StubAnalyticsExporter.
+
+Пример запуска:
+    python load_test.py --rate 20 --duration 30 --json report.json
+
+Время до первого содержательного ответа при потоковом анализе региона (region_first_content)
+при генерации ответа за 3 с:
+    python load_test.py --rate 5 --duration 10 --openai-latency 3
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import ModuleType, SimpleNamespace
+from typing import Dict, List, Optional
+
+from telegram.ext import ApplicationHandlerStop
+
+
+class StubAnalyticsExporter:
+    """Замена analytics.AnalyticsExporter, если модуля нет в дереве.
+
+    Читает те же таблицы, что и полный отчет, и пишет их в CSV,
+    чтобы сценарий выгрузки администратора нагружал базу и диск.
+    """
+
+    def __init__(self, db_path: str, export_dir: str):
+        self.db_path = db_path
+        self.export_dir = export_dir
+
+    def export_complete_report(self) -> str:
+        os.makedirs(self.export_dir, exist_ok=True)
+        filename = f"{self.export_dir}/report_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.csv"
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with open(filename, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                for table in ("users", "user_interests", "sent_offers"):
+                    writer.writerows(conn.execute(f"SELECT * FROM {table}"))
+        finally:
+            conn.close()
+        return filename
+
+
+# main импортирует analytics на уровне модуля; без него бот не импортируется
+try:
+    import analytics
+except ImportError:
+    sys.modules["analytics"] = ModuleType("analytics")
+    sys.modules["analytics"].AnalyticsExporter = StubAnalyticsExporter
+
+import main as bot_module
+from backup import SnapshotManager
+
+STUB_ANALYSIS = {
+    "telegram_channels": ["@auto_region", "@cars_sale", "@auto_news", "@drive_club", "@car_market"],
+    "chat_groups": ["Авторынок региона", "Продажа авто", "Автолюбители"],
+    "market_potential": "средний",
+    "potential_clients": 1500,
+    "recommendations": "Размещать объявления в региональных каналах."
+}
+
+REGIONS = ["Москва", "Санкт-Петербург", "Краснодарский край", "Новосибирская область", "Татарстан", "мск", "питер", "Краснадар"]
+
+
+class FakeBot:
+    """Фейковый Telegram-бот: считает вызовы API и имитирует сетевую задержку"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def _call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_document(self, chat_id, document, caption=None, **kwargs):
+        if hasattr(document, 'close'):
+            document.close()
+        await self._call()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call()
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, text: str = ""):
+        self._bot = bot
+        self.text = text
+        self.replies: List["FakeMessage"] = []
+        self.first_edit_at: Optional[float] = None
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        await self._bot._call()
+        reply = FakeMessage(self._bot, text)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text, reply_markup=None, **kwargs):
+        await self._bot._call()
+        if self.first_edit_at is None:
+            self.first_edit_at = time.perf_counter()
+        self.text = text
+        return self
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot: FakeBot, user, data: str):
+        self._bot = bot
+        self.from_user = user
+        self.data = data
+        self.message = FakeMessage(bot)
+
+    async def answer(self, text=None, **kwargs):
+        await self._bot._call()
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        await self._bot._call()
+        self.message.text = text
+
+
+class StubOpenAIClient:
+    """Локальная заглушка AsyncOpenAI: отдает заранее известный ответ потоком фрагментов.
+
+    latency - время генерации всего ответа, оно равномерно распределяется по фрагментам.
+    """
+
+    def __init__(self, latency: float, chunk_size: int = 8):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, stream: bool = False, **kwargs):
+        content = json.dumps(STUB_ANALYSIS, ensure_ascii=False, indent=2)
+        chunks = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+        return self._stream(chunks)
+
+    async def _stream(self, chunks: List[str]):
+        delay = self.latency / len(chunks)
+        for text in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            delta = SimpleNamespace(content=text)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def make_user(user_id: int):
+    return SimpleNamespace(id=user_id, username=f"user{user_id}", first_name=f"Тест{user_id}", last_name=None)
+
+
+def make_command_update(bot: FakeBot, user, text: str):
+    return SimpleNamespace(effective_user=user, message=FakeMessage(bot, text), callback_query=None)
+
+
+def make_callback_update(bot: FakeBot, user, data: str):
+    return SimpleNamespace(effective_user=user, message=None, callback_query=FakeCallbackQuery(bot, user, data))
+
+
+def _percentile(values: List[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга по отсортированному списку"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def _db_size(db_path: str) -> int:
+    """Размер базы вместе с журналом"""
+    size = 0
+    for suffix in ("", "-wal", "-journal"):
+        if os.path.exists(db_path + suffix):
+            size += os.path.getsize(db_path + suffix)
+    return size
+
+
+class LoadTest:
+    """Прогон сценариев пользователей и администраторов через CarSalesBot"""
+
+    def __init__(self, bot, fake_bot: FakeBot, admin_id: int, admin_share: float,
+                 spam_share: float = 0.0, spam_clicks: int = 50):
+        self.bot = bot
+        self.fake_bot = fake_bot
+        self.admin_id = admin_id
+        self.admin_share = admin_share
+        self.spam_share = spam_share
+        self.spam_clicks = spam_clicks
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.throttled: Dict[str, int] = {}
+        self.flows_done = 0
+        self.loop_lags: List[float] = []
+
+    async def _step(self, name: str, update, context, handler):
+        """Обновление проходит антифлуд, как в Application, а затем обработчик"""
+        started = time.perf_counter()
+        try:
+            await self.bot.throttle(update, context)
+            await handler(update, context)
+        except ApplicationHandlerStop:
+            self.throttled[name] = self.throttled.get(name, 0) + 1
+        except Exception:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+    async def _click(self, name: str, user, context):
+        update = make_callback_update(self.fake_bot, user, name)
+        await self._step(name, update, context, self.bot.handle_button_click)
+
+    async def _start(self, user, context):
+        update = make_command_update(self.fake_bot, user, "/start")
+        await self._step("start", update, context, self.bot.start)
+
+    async def user_flow(self, user_id: int, rng: random.Random):
+        """/start -> interest_cars -> analyze_region + регион -> get_offer"""
+        user = make_user(user_id)
+        context = SimpleNamespace(bot=self.fake_bot, user_data={})
+
+        await self._start(user, context)
+        await self._click("interest_cars", user, context)
+        await self._click("analyze_region", user, context)
+        region_update = make_command_update(self.fake_bot, user, rng.choice(REGIONS))
+        started = time.perf_counter()
+        await self._step("region_input", region_update, context, self.bot.handle_message)
+        # Время до первого содержательного обновления ответа (потоковый анализ)
+        replies = region_update.message.replies
+        if replies and replies[0].first_edit_at is not None:
+            self.latencies.setdefault("region_first_content", []).append(replies[0].first_edit_at - started)
+        await self._click("get_offer", user, context)
+        self.flows_done += 1
+
+    async def admin_flow(self):
+        """/start -> admin_export -> export_excel"""
+        user = make_user(self.admin_id)
+        context = SimpleNamespace(bot=self.fake_bot, user_data={})
+
+        await self._start(user, context)
+        await self._click("admin_export", user, context)
+        await self._click("export_excel", user, context)
+        self.flows_done += 1
+
+    async def spam_flow(self, user_id: int, clicks: int):
+        """Флуд: пользователь без пауз жмет кнопки меню и запрашивает КП"""
+        user = make_user(user_id)
+        context = SimpleNamespace(bot=self.fake_bot, user_data={})
+
+        await self._start(user, context)
+        for i in range(clicks):
+            await self._click("get_offer" if i % 5 == 4 else "interest_cars", user, context)
+        self.flows_done += 1
+
+    async def _monitor_loop_lag(self, interval: float, stop: asyncio.Event):
+        """Измерение задержки event loop: насколько позже запланированного просыпается sleep"""
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lags.append(max(0.0, loop.time() - expected))
+
+    async def run(self, rate: float, duration: float, seed: int, first_user_id: int = 1_000_000) -> float:
+        rng = random.Random(seed)
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self._monitor_loop_lag(0.05, stop))
+        tasks = []
+
+        started = time.perf_counter()
+        total_flows = max(1, int(rate * duration))
+        for i in range(total_flows):
+            # Выдерживаем заданную интенсивность запуска сценариев
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            roll = rng.random()
+            if roll < self.admin_share:
+                tasks.append(asyncio.create_task(self.admin_flow()))
+            elif roll < self.admin_share + self.spam_share:
+                tasks.append(asyncio.create_task(self.spam_flow(first_user_id + i, self.spam_clicks)))
+            else:
+                tasks.append(asyncio.create_task(self.user_flow(first_user_id + i, rng)))
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        return elapsed
+
+    def report(self, elapsed: float, db_before: int, db_after: int) -> Dict:
+        handlers = {}
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            handlers[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "throttled": self.throttled.get(name, 0),
+                "p50_ms": _percentile(values, 50) * 1000,
+                "p95_ms": _percentile(values, 95) * 1000,
+                "p99_ms": _percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+
+        lags = sorted(self.loop_lags)
+        requests = sum(len(v) for v in self.latencies.values())
+        return {
+            "elapsed_s": elapsed,
+            "flows": self.flows_done,
+            "requests": requests,
+            "throughput_rps": requests / elapsed if elapsed else 0.0,
+            "telegram_api_calls": self.fake_bot.calls,
+            "handlers": handlers,
+            "db_size_before": db_before,
+            "db_size_after": db_after,
+            "db_growth_per_flow": (db_after - db_before) / self.flows_done if self.flows_done else 0.0,
+            "loop_lag_p50_ms": _percentile(lags, 50) * 1000,
+            "loop_lag_p99_ms": _percentile(lags, 99) * 1000,
+            "loop_lag_max_ms": (lags[-1] if lags else 0.0) * 1000,
+        }
+
+
+def print_report(report: Dict):
+    print(f"Длительность: {report['elapsed_s']:.2f} с, сценариев: {report['flows']}, "
+          f"запросов: {report['requests']}")
+    print(f"Пропускная способность: {report['throughput_rps']:.1f} запросов/с, "
+          f"вызовов Telegram API: {report['telegram_api_calls']}")
+    print()
+    print(f"{'Обработчик':<22}{'кол-во':>8}{'ошибки':>8}{'отсеч.':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for name, stats in report['handlers'].items():
+        print(f"{name:<22}{stats['count']:>8}{stats['errors']:>8}{stats['throttled']:>8}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    print()
+    growth = report['db_size_after'] - report['db_size_before']
+    print(f"Рост базы: {growth / 1024:.1f} КБ ({report['db_growth_per_flow']:.0f} байт на сценарий)")
+    print(f"Задержка event loop: p50 {report['loop_lag_p50_ms']:.1f} мс, "
+          f"p99 {report['loop_lag_p99_ms']:.1f} мс, max {report['loop_lag_max_ms']:.1f} мс")
+    print(f"Последнее обновление снимка базы: {report['snapshot_last_duration_s']:.2f} с")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочное тестирование CarSalesBot")
+    parser.add_argument("--rate", type=float, default=10.0, help="Сценариев в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность подачи нагрузки, с")
+    parser.add_argument("--admin-share", type=float, default=0.02, help="Доля сценариев администратора")
+    parser.add_argument("--spam-share", type=float, default=0.0, help="Доля сценариев-флудеров")
+    parser.add_argument("--spam-clicks", type=int, default=50, help="Нажатий за сценарий флудера")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="Время генерации ответа заглушкой OpenAI, с")
+    parser.add_argument("--edit-interval", type=float, help="Интервал правок при потоковом анализе, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="Задержка фейкового Telegram API, с")
+    parser.add_argument("--snapshot-interval", type=float,
+                        help="Обновлять снимок базы во время теста с этим интервалом, с (влияние бэкапа на запись)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", help="Рабочий каталог (по умолчанию временный)")
+    parser.add_argument("--json", dest="json_path", help="Сохранить отчет в JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="carsales_load_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    # Отдельная база и каталоги выгрузок, чтобы не трогать рабочие данные
+    db_path = os.path.join(workdir, "load_test.db")
+    bot_module.DB_PATH = db_path
+    bot_module.EXPORT_DIR = os.path.join(workdir, "exports")
+    bot_module.SNAPSHOT_PATH = os.path.join(workdir, "load_test.snapshot.db")
+    if args.edit_interval is not None:
+        bot_module.STREAM_EDIT_INTERVAL = args.edit_interval
+
+    bot = bot_module.CarSalesBot()
+    bot.openai_client = StubOpenAIClient(args.openai_latency)
+    fake_bot = FakeBot(args.telegram_latency)
+    admin_id = bot_module.ADMIN_IDS[0] if bot_module.ADMIN_IDS else 1
+    load_test = LoadTest(bot, fake_bot, admin_id, args.admin_share, args.spam_share, args.spam_clicks)
+
+    # Снимок нужен сразу: из него читают выгрузки администратора
+    snapshots = SnapshotManager(db_path, bot_module.SNAPSHOT_PATH, args.snapshot_interval or 0)
+    snapshots.refresh()
+    if args.snapshot_interval:
+        snapshots.start()
+
+    db_before = _db_size(db_path)
+    try:
+        elapsed = asyncio.run(load_test.run(args.rate, args.duration, args.seed))
+    finally:
+        snapshots.stop()
+    report = load_test.report(elapsed, db_before, _db_size(db_path))
+    report["snapshot_last_duration_s"] = snapshots.last_duration
+
+    print(f"Рабочий каталог: {workdir}")
+    print_report(report)
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,40 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, 
+    ApplicationHandlerStop,
     CommandHandler, 
     CallbackQueryHandler, 
     MessageHandler, 
+    TypeHandler,
     filters, 
     ContextTypes
 )
 
-import openai
+from openai import AsyncOpenAI
 
-from config import BOT_TOKEN, OPENAI_API_KEY, ADMIN_IDS, DB_PATH, EXPORT_DIR
+from config import (
+    BOT_TOKEN, OPENAI_API_KEY, ADMIN_IDS, DB_PATH, EXPORT_DIR, PERSISTENCE_UPDATE_INTERVAL,
+    SEARCH_PAGE_SIZE, TOP_LEADS_LIMIT, STREAM_EDIT_INTERVAL, REGION_INPUT_ATTEMPTS,
+    THROTTLE_USER_RATE, THROTTLE_USER_BURST, THROTTLE_GLOBAL_RATE, THROTTLE_GLOBAL_BURST, THROTTLE_COSTS,
+    THROTTLE_NOTICE_INTERVAL, THROTTLE_NOTICE_GLOBAL_RATE,
+    PROFILE_SAMPLE_INTERVAL, PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS,
+    SNAPSHOT_PATH, SNAPSHOT_INTERVAL, SNAPSHOT_PAGES_PER_STEP, SNAPSHOT_STEP_SLEEP,
+    BACKUP_DIR, BACKUP_EVERY, BACKUP_KEEP
+)
 from database import DatabaseManager
 from analytics import AnalyticsExporter
+from backup import SnapshotManager
 from pdf_generator import PDFGenerator
+from persistence import SQLitePersistence
+from profiling import Profiler
+from region_index import RegionIndex
+from streaming import PartialJSONParser, ThrottledMessageEditor
+from throttling import Throttler
 
 # Настройка логирования
 logging.basicConfig(
@@ -28,11 +44,56 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class CarSalesBot:
-    def __init__(self):
-        self.db = DatabaseManager(DB_PATH)
-        self.exporter = AnalyticsExporter(DB_PATH, EXPORT_DIR)
+    def __init__(self, db: Optional[DatabaseManager] = None, reports: Optional[DatabaseManager] = None,
+                 exporter=None, shard: Optional[int] = None):
+        self.db = db or DatabaseManager(DB_PATH)
+        # Выгрузки и запросы администратора читают снимок базы, а не рабочий файл
+        self.reports = reports or DatabaseManager(SNAPSHOT_PATH, read_only=True)
+        self.exporter = exporter or AnalyticsExporter(SNAPSHOT_PATH, EXPORT_DIR)
+        # Номер шарда в многопроцессном режиме (sharding.py), None - один процесс
+        self.shard = shard
         self.pdf_gen = PDFGenerator()
-        openai.api_key = OPENAI_API_KEY
+        self.regions = RegionIndex()
+        self.profiler = Profiler(PROFILE_SAMPLE_INTERVAL)
+        self.throttler = Throttler(
+            THROTTLE_USER_RATE, THROTTLE_USER_BURST, THROTTLE_GLOBAL_RATE, THROTTLE_GLOBAL_BURST,
+            THROTTLE_COSTS
+        )
+        # Отдельное ведро для предупреждений о флуде: одно на пользователя за интервал
+        self.notice_throttler = Throttler(
+            1 / THROTTLE_NOTICE_INTERVAL, 1, THROTTLE_NOTICE_GLOBAL_RATE, THROTTLE_NOTICE_GLOBAL_RATE
+        )
+        self.openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    
+    async def throttle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Антифлуд перед всеми обработчиками: лишние запросы не доходят до базы и OpenAI"""
+        user = update.effective_user
+        if user is None or user.id in ADMIN_IDS:
+            return
+        
+        if self.throttler.allow(user.id, self._update_action(update, context)):
+            return
+        
+        # Кнопку нужно подтвердить, иначе у пользователя останется индикатор загрузки
+        if update.callback_query:
+            await update.callback_query.answer("⏳ Слишком много запросов, подождите немного.")
+        elif update.message and self.notice_throttler.allow(user.id, "notice"):
+            # На сообщения отвечаем не чаще раза в THROTTLE_NOTICE_INTERVAL, иначе бот просто молчит
+            await update.message.reply_text("⏳ Слишком много запросов, подождите немного.")
+        raise ApplicationHandlerStop
+    
+    def _update_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+        """Тип действия для расчета стоимости запроса"""
+        if update.callback_query:
+            return (update.callback_query.data or "").split(":", 1)[0]
+        
+        text = update.message.text if update.message and update.message.text else ""
+        if text.startswith("/"):
+            return text[1:].split(maxsplit=1)[0] if len(text) > 1 else "command"
+        if context.user_data.get('waiting_for_region'):
+            # Стоимость запроса к OpenAI списывается позже, только за распознанный регион
+            return "region_input"
+        return "message"
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /start"""
@@ -49,6 +110,9 @@ class CarSalesBot:
         # Логируем команду
         self.db.log_message(user.id, "/start", "command")
         
+        # /start возвращает в главное меню, в том числе из ожидания ввода региона
+        self._stop_waiting_for_region(context)
+        
         # Создаем меню
         keyboard = [
             [InlineKeyboardButton("🚗 Интересуюсь автомобилями", callback_data="interest_cars")],
@@ -90,6 +154,10 @@ class CarSalesBot:
             await self._handle_export_excel(query, context)
         elif action == "export_detailed":
             await self._handle_export_detailed(query, context)
+        elif action == "admin_profile":
+            await self._handle_admin_profile(query, context)
+        elif action.startswith("search_page:"):
+            await self._handle_search_page(query, context, action.split(":", 1)[1])
     
     async def _handle_car_interest(self, query, context):
         """Обработка интереса к автомобилям"""
@@ -119,6 +187,11 @@ class CarSalesBot:
             "Например:\n• Москва\n• Санкт-Петербург\n• Краснодарский край\n• Новосибирская область"
         )
         context.user_data['waiting_for_region'] = True
+        context.user_data['region_attempts'] = 0
+    
+    def _stop_waiting_for_region(self, context):
+        context.user_data.pop('waiting_for_region', None)
+        context.user_data.pop('region_attempts', None)
     
     async def _handle_offer_request(self, query, context):
         """Обработка запроса коммерческого предложения"""
@@ -153,6 +226,7 @@ class CarSalesBot:
         keyboard = [
             [InlineKeyboardButton("📊 Excel отчет", callback_data="export_excel")],
             [InlineKeyboardButton("📋 Детальная выгрузка", callback_data="export_detailed")],
+            [InlineKeyboardButton(f"🔬 Профилирование ({PROFILE_DEFAULT_SECONDS} с)", callback_data="admin_profile")],
             [InlineKeyboardButton("◀️ Назад", callback_data="back_to_main")],
         ]
         
@@ -168,7 +242,9 @@ class CarSalesBot:
         await query.edit_message_text("🔄 Формирую Excel отчет... Это может занять несколько минут.")
         
         try:
-            file_path = self.exporter.export_complete_report()
+            # Выгрузка (в многопроцессном режиме - еще и слияние снимков шардов) идет минуты;
+            # в отдельном потоке она не останавливает обработку обновлений остальных пользователей
+            file_path = await asyncio.to_thread(self.exporter.export_complete_report)
             
             if file_path:
                 await context.bot.send_document(
@@ -183,6 +259,146 @@ class CarSalesBot:
             logger.error(f"Ошибка выгрузки: {e}")
             await query.edit_message_text("❌ Произошла ошибка при выгрузке данных.")
     
+    async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Поиск по сообщениям клиентов: /search <текст> (только для администраторов)"""
+        user_id = update.effective_user.id
+        if user_id not in ADMIN_IDS:
+            return
+        
+        search_query = " ".join(context.args)
+        if not search_query:
+            await update.message.reply_text(
+                "🔎 Укажите текст для поиска, например:\n/search тойота кредит"
+            )
+            return
+        
+        context.user_data['search_query'] = search_query
+        text, reply_markup = self._format_search_page(search_query, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+    
+    async def leads_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Самые заинтересованные клиенты: /leads [регион] (только для администраторов)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            return
+        
+        region = None
+        if context.args:
+            # Регион хранится как субъект РФ: "/leads мск" и "/leads Казань" приводятся к нему
+            match = self.regions.resolve(" ".join(context.args))
+            if match is None:
+                await update.message.reply_text(f"🤔 Регион «{' '.join(context.args)[:50]}» не распознан.")
+                return
+            region = match.subject
+        leads = self.reports.get_top_leads(region, TOP_LEADS_LIMIT)
+        title = f"🔥 Самые заинтересованные клиенты{f' ({region})' if region else ''}:\n"
+        
+        if not leads:
+            await update.message.reply_text(f"{title}\nПока нет клиентов с ненулевым баллом.")
+            return
+        
+        lines = [title]
+        for position, lead in enumerate(leads, 1):
+            name = lead['first_name'] or "Без имени"
+            username = f"@{lead['username']}" if lead['username'] else f"ID {lead['user_id']}"
+            lead_region = f" · {lead['region']}" if lead['region'] and not region else ""
+            lines.append(f"{position}. {name} ({username}){lead_region} — {lead['interest_level']} баллов")
+        
+        await update.message.reply_text("\n".join(lines))
+    
+    async def _handle_search_page(self, query, context, page_data: str):
+        """Переход по страницам результатов поиска"""
+        search_query = context.user_data.get('search_query')
+        if query.from_user.id not in ADMIN_IDS or not search_query:
+            return
+        
+        # Данные кнопки приходят от клиента и могут быть произвольными
+        try:
+            page = int(page_data)
+        except ValueError:
+            return
+        if page < 0:
+            return
+        
+        text, reply_markup = self._format_search_page(search_query, page)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    
+    def _format_search_page(self, search_query: str, page: int):
+        """Страница результатов поиска с кнопками навигации"""
+        # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+        results = self.reports.search_messages(search_query, SEARCH_PAGE_SIZE + 1, page * SEARCH_PAGE_SIZE)
+        has_next = len(results) > SEARCH_PAGE_SIZE
+        results = results[:SEARCH_PAGE_SIZE]
+        
+        if not results:
+            return f"🔎 По запросу «{search_query}» ничего не найдено.", None
+        
+        lines = [f"🔎 Результаты по запросу «{search_query}», страница {page + 1}:\n"]
+        for item in results:
+            name = item['first_name'] or "Без имени"
+            username = f"@{item['username']}" if item['username'] else f"ID {item['user_id']}"
+            region = f" · {item['region']}" if item['region'] else ""
+            lines.append(f"👤 {name} ({username}){region} · {item['timestamp']}\n{item['text'][:200]}\n")
+        
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"search_page:{page - 1}"))
+        if has_next:
+            buttons.append(InlineKeyboardButton("Далее ▶️", callback_data=f"search_page:{page + 1}"))
+        
+        reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+        return "\n".join(lines), reply_markup
+    
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Профилирование работающего бота: /profile [секунды] (только для администраторов)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            return
+        
+        seconds = PROFILE_DEFAULT_SECONDS
+        if context.args and context.args[0].isdigit():
+            seconds = min(max(int(context.args[0]), 1), PROFILE_MAX_SECONDS)
+        
+        await self._start_profiling(update.effective_user.id, context, seconds)
+    
+    async def _handle_admin_profile(self, query, context):
+        """Профилирование из меню выгрузки"""
+        if query.from_user.id not in ADMIN_IDS:
+            return
+        await self._start_profiling(query.from_user.id, context, PROFILE_DEFAULT_SECONDS)
+    
+    async def _start_profiling(self, chat_id: int, context, seconds: int):
+        if self.profiler.active:
+            await context.bot.send_message(chat_id=chat_id, text="🔬 Профилирование уже идет, дождитесь отчета.")
+            return
+        
+        self.profiler.start()
+        # В многопроцессном режиме профилируется только процесс, получивший команду
+        scope = f"\nПрофилируется только процесс шарда {self.shard}." if self.shard is not None else ""
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"🔬 Профилирование запущено на {seconds} с. Отчет придет по окончании.{scope}"
+        )
+        # Ожидание идет отдельной задачей, чтобы не задерживать обработку остальных обновлений
+        context.application.create_task(self._finish_profiling(chat_id, context, seconds))
+    
+    async def _finish_profiling(self, chat_id: int, context, seconds: int):
+        """Остановка профилирования и отправка отчета"""
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            report = self.profiler.stop()
+        
+        try:
+            file_path = report.save_collapsed(EXPORT_DIR)
+            with open(file_path, 'rb') as document:
+                await context.bot.send_document(
+                    chat_id=chat_id,
+                    document=document,
+                    caption="🔥 Стеки в формате collapsed (flamegraph.pl, speedscope.app)"
+                )
+            await context.bot.send_message(chat_id=chat_id, text=report.summary())
+        except Exception as e:
+            logger.error(f"Ошибка отправки отчета профилирования: {e}")
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка текстовых сообщений"""
         user_id = update.effective_user.id
@@ -192,29 +408,59 @@ class CarSalesBot:
         self.db.log_message(user_id, message_text, "text")
         
         # Проверяем, ждем ли мы ввод региона
+        menu_text = "Выберите опцию из меню:"
         if context.user_data.get('waiting_for_region'):
-            await self._process_region_input(update, context, message_text)
-            context.user_data['waiting_for_region'] = False
-        else:
-            # Обычное сообщение - предлагаем меню
-            keyboard = [
-                [InlineKeyboardButton("🚗 Автомобили", callback_data="interest_cars")],
-                [InlineKeyboardButton("📊 Анализ региона", callback_data="analyze_region")],
-                [InlineKeyboardButton("📄 КП", callback_data="get_offer")],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            if await self._process_region_input(update, context, message_text):
+                self._stop_waiting_for_region(context)
+                return
             
-            await update.message.reply_text(
-                "Выберите опцию из меню:",
-                reply_markup=reply_markup
-            )
+            # Нераспознанный ввод не сразу сбрасывает ожидание: пользователь может уточнить регион
+            attempts = context.user_data.get('region_attempts', 0) + 1
+            if attempts < REGION_INPUT_ATTEMPTS:
+                context.user_data['region_attempts'] = attempts
+                await update.message.reply_text(
+                    f"🤔 Не удалось распознать регион «{message_text[:50]}».\n\n"
+                    "Введите название области, края, республики или крупного города, например:\n"
+                    "• Москва\n• Краснодарский край\n• Екатеринбург"
+                )
+                return
+            
+            # Похоже, пользователь пишет не регион - возвращаемся к меню
+            self._stop_waiting_for_region(context)
+            menu_text = f"🤔 Не удалось распознать регион «{message_text[:50]}».\n\n{menu_text}"
+        
+        # Обычное сообщение - предлагаем меню
+        keyboard = [
+            [InlineKeyboardButton("🚗 Автомобили", callback_data="interest_cars")],
+            [InlineKeyboardButton("📊 Анализ региона", callback_data="analyze_region")],
+            [InlineKeyboardButton("📄 КП", callback_data="get_offer")],
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await update.message.reply_text(
+            menu_text,
+            reply_markup=reply_markup
+        )
     
-    async def _process_region_input(self, update, context, region: str):
-        """Обработка введенного региона"""
+    async def _process_region_input(self, update, context, region_text: str) -> bool:
+        """Обработка введенного региона. Возвращает False, если регион не распознан"""
         user_id = update.effective_user.id
         
-        # Сохраняем регион
-        self.db.update_user_region(user_id, region)
+        # Приводим ввод к каноническому названию до обращения к OpenAI
+        match = self.regions.resolve(region_text)
+        if match is None:
+            return False
+        region = match.name
+        
+        if user_id not in ADMIN_IDS and not self.throttler.allow(user_id, "region_analysis"):
+            await update.message.reply_text(
+                "⏳ Слишком много запросов на анализ. Подождите немного и снова нажмите «📊 Анализ региона»."
+            )
+            return True
+        
+        # В карточке пользователя - субъект РФ, чтобы "Казань" и "Татарстан" попадали в одну группу
+        # статистики и /leads; анализ и интерес - по тому, что ввел пользователь (городу)
+        self.db.update_user_region(user_id, match.subject)
         self.db.log_interest(user_id, "region_analysis", region)
         
         # Анализируем регион с помощью AI
@@ -222,21 +468,48 @@ class CarSalesBot:
             f"🔍 Анализирую регион {region}...\nЭто займет несколько секунд."
         )
         
+        # Показываем каналы, группы и рекомендации по мере того, как модель их пишет
+        parser = PartialJSONParser()
+        editor = ThrottledMessageEditor(analysis_msg, STREAM_EDIT_INTERVAL)
+        streamed_fully = False
         try:
-            analysis = await self._analyze_region_with_ai(region)
-            response = self._format_analysis_response(region, analysis)
-            
-            await analysis_msg.edit_text(response)
-            
+            async for chunk in self._stream_region_analysis(region):
+                parser.feed(chunk)
+                if editor.ready():
+                    partial = parser.snapshot()
+                    if partial:
+                        await editor.edit(self._format_partial_analysis(region, partial))
+            streamed_fully = True
         except Exception as e:
             logger.error(f"Ошибка анализа региона: {e}")
-            await analysis_msg.edit_text(
-                f"❌ Не удалось проанализировать регион {region}.\n"
-                "Попробуйте позже или уточните название региона."
-            )
+        
+        failure_text = (
+            f"❌ Не удалось проанализировать регион {region}.\n"
+            "Попробуйте позже или уточните название региона."
+        )
+        analysis = parser.result()
+        if not analysis:
+            text = failure_text
+        elif streamed_fully and parser.complete:
+            text = self._format_analysis_response(region, analysis)
+        else:
+            # Ответ оборван или испорчен - оставляем то, что успели разобрать
+            logger.warning(f"Неполный ответ анализа региона {region}")
+            text = self._format_partial_analysis(region, analysis, finished=True)
+        
+        try:
+            await editor.edit(text, final=True)
+        except Exception as e:
+            # Сообщение удалено, лимит правок не истек и т.п. - сообщаем отдельным ответом
+            logger.error(f"Не удалось показать анализ региона {region}: {e}")
+            try:
+                await update.message.reply_text(failure_text)
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение об ошибке анализа: {e}")
+        return True
     
-    async def _analyze_region_with_ai(self, region: str) -> Dict:
-        """Анализ региона с помощью OpenAI"""
+    async def _stream_region_analysis(self, region: str):
+        """Анализ региона с помощью OpenAI: фрагменты ответа по мере генерации"""
         prompt = f"""
         Проанализируй регион {region} для продажи автомобилей и предоставь:
         
@@ -256,15 +529,40 @@ class CarSalesBot:
         }}
         """
         
-        response = openai.ChatCompletion.create(
+        stream = await self.openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=1000,
+            stream=True
         )
         
-        import json
-        return json.loads(response.choices[0].message.content)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def _format_partial_analysis(self, region: str, analysis: Dict, finished: bool = False) -> str:
+        """Форматирование уже полученной части анализа: только пришедшие разделы"""
+        parts = [f"📊 Анализ региона: {region}\n"]
+        
+        if 'market_potential' in analysis:
+            parts.append(f"📈 Потенциал рынка: {str(analysis['market_potential']).upper()}")
+        if 'potential_clients' in analysis:
+            parts.append(f"👥 Потенциальных клиентов: {analysis['potential_clients']}")
+        if analysis.get('telegram_channels'):
+            channels = "\n".join([f"• {ch}" for ch in analysis['telegram_channels'][:5]])
+            parts.append(f"\n📢 Рекомендуемые каналы:\n{channels}")
+        if analysis.get('chat_groups'):
+            groups = "\n".join([f"• {gr}" for gr in analysis['chat_groups'][:5]])
+            parts.append(f"\n💬 Рекомендуемые группы:\n{groups}")
+        if analysis.get('recommendations'):
+            parts.append(f"\n💡 Рекомендации:\n{analysis['recommendations']}")
+        
+        if finished:
+            parts.append("\n⚠️ Анализ получен не полностью. Попробуйте запросить его позже.")
+        else:
+            parts.append("\n⏳ Анализ продолжается...")
+        return "\n".join(parts)
     
     def _format_analysis_response(self, region: str, analysis: Dict) -> str:
         """Форматирование ответа анализа"""
@@ -309,21 +607,43 @@ class CarSalesBot:
                 text="❌ Извините, произошла ошибка при отправке предложения. Попробуйте позже."
             )
 
+def register_handlers(application: Application, bot: CarSalesBot):
+    """Регистрация обработчиков бота в приложении"""
+    # Группа -1 выполняется раньше остальных и может остановить обработку обновления
+    application.add_handler(TypeHandler(Update, bot.throttle), group=-1)
+    
+    # Обработчики обернуты для /profile: вне окна профилирования обертка почти бесплатна
+    trace = bot.profiler.trace
+    application.add_handler(CommandHandler("start", trace("start", bot.start)))
+    application.add_handler(CommandHandler("search", trace("search", bot.search_command)))
+    application.add_handler(CommandHandler("leads", trace("leads", bot.leads_command)))
+    application.add_handler(CommandHandler("profile", bot.profile_command))
+    application.add_handler(CallbackQueryHandler(trace("button", bot.handle_button_click)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, trace("message", bot.handle_message)))
+
 def main():
     """Запуск бота"""
     bot = CarSalesBot()
     
-    # Создаем приложение
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Первый снимок делаем до запуска, чтобы выгрузки были доступны сразу
+    snapshots = SnapshotManager(
+        DB_PATH, SNAPSHOT_PATH, SNAPSHOT_INTERVAL, SNAPSHOT_PAGES_PER_STEP, SNAPSHOT_STEP_SLEEP,
+        BACKUP_DIR, BACKUP_EVERY, BACKUP_KEEP
+    )
+    snapshots.refresh()
+    snapshots.start()
     
-    # Добавляем обработчики
-    application.add_handler(CommandHandler("start", bot.start))
-    application.add_handler(CallbackQueryHandler(bot.handle_button_click))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
+    # Создаем приложение; состояние диалогов (context.user_data) хранится в базе бота
+    persistence = SQLitePersistence(DB_PATH, update_interval=PERSISTENCE_UPDATE_INTERVAL)
+    application = Application.builder().token(BOT_TOKEN).persistence(persistence).build()
+    register_handlers(application, bot)
     
     # Запускаем бота
     print("Бот запущен...")
-    application.run_polling()
+    try:
+        application.run_polling()
+    finally:
+        snapshots.stop()
 
 if __name__ == "__main__":
     main()
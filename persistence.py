@@ -0,0 +1,221 @@
+"""Хранение context.user_data в базе бота.
+
+В отличие от PicklePersistence, который при каждом сбросе переписывает файл целиком,
+SQLitePersistence хранит данные каждого пользователя отдельной строкой:
+- состояние пользователя читается из базы при первом обращении к нему;
+- измененные записи пишутся пачкой одной транзакцией раз в update_interval;
+- неизменившиеся записи не пишутся вовсе: для сравнения в памяти хранится только
+  хэш сохраненного состояния, а пользователи, не обращавшиеся дольше IDLE_TIMEOUT,
+  забываются и при следующем обращении перечитываются из базы.
+Стоимость хранения растет с числом активных пользователей, а не всех пользователей.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд без обращений пользователь забывается, и как часто таких искать
+IDLE_TIMEOUT = 3600.0
+SWEEP_INTERVAL = 300.0
+
+
+def _digest(serialized: str) -> bytes:
+    return hashlib.blake2b(serialized.encode(), digest_size=16).digest()
+
+
+class SQLitePersistence(BasePersistence):
+    """Построчное хранение user_data в SQLite с ленивой загрузкой и пакетной записью"""
+
+    def __init__(self, db_path: str, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db_path = db_path
+        # Хэш последнего сохраненного состояния недавно активных пользователей (None - записи нет)
+        self._stored: Dict[int, Optional[bytes]] = {}
+        # Время последнего обращения пользователя (time.monotonic)
+        self._last_seen: Dict[int, float] = {}
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+        # Измененные записи, ожидающие записи в базу
+        self._dirty: Dict[int, str] = {}
+        self._write_task: Optional[asyncio.Task] = None
+        self.init_table()
+
+    def init_table(self):
+        """Создание таблицы состояний пользователей"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_state (
+                user_id INTEGER PRIMARY KEY,
+                user_data TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def _load_user(self, user_id: int) -> Optional[str]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT user_data FROM user_state WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+
+        return row[0] if row else None
+
+    def _write_batch(self, batch: Dict[int, str]):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.executemany('''
+            INSERT INTO user_state (user_id, user_data, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                user_data = excluded.user_data,
+                updated_at = excluded.updated_at
+        ''', batch.items())
+
+        conn.commit()
+        conn.close()
+
+    async def _write_dirty(self):
+        """Запись накопленных изменений одной транзакцией на пакет.
+
+        Задача записи одна: пока она жива, новые изменения копятся в _dirty и пишутся
+        следующим пакетом после завершения текущего, поэтому старый пакет не может
+        перезаписать в базе более свежий.
+        """
+        # Даем отработать остальным update_user_data из того же цикла Application.update_persistence
+        await asyncio.sleep(0)
+        try:
+            while self._dirty:
+                batch, self._dirty = self._dirty, {}
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                    logger.debug(f"Сохранено состояние {len(batch)} пользователей")
+                except Exception as e:
+                    logger.error(f"Ошибка сохранения состояния пользователей: {e}")
+                    # Возвращаем записи в очередь, если их не перезаписали более свежими;
+                    # повторная попытка - при следующем update_user_data или flush
+                    for user_id, data in batch.items():
+                        self._dirty.setdefault(user_id, data)
+                        self._stored.pop(user_id, None)
+                    break
+        finally:
+            self._write_task = None
+
+    def _sweep(self, now: float):
+        """Забываем давно не обращавшихся пользователей, у которых нет несохраненных изменений"""
+        idle_since = now - IDLE_TIMEOUT
+        for user_id, seen in list(self._last_seen.items()):
+            if seen < idle_since and user_id not in self._dirty:
+                del self._last_seen[user_id]
+                self._stored.pop(user_id, None)
+        self._next_sweep = now + SWEEP_INTERVAL
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        # Ничего не загружаем заранее: состояние подтягивается в refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """Ленивая загрузка состояния при первом обращении пользователя"""
+        now = time.monotonic()
+        self._last_seen[user_id] = now
+        if now >= self._next_sweep:
+            self._sweep(now)
+        if user_id in self._stored:
+            return
+
+        stored = self._load_user(user_id)
+        self._stored[user_id] = _digest(stored) if stored else None
+        if stored:
+            for key, value in json.loads(stored).items():
+                user_data.setdefault(key, value)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        try:
+            serialized = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Состояние пользователя {user_id} не сериализуется в JSON: {e}")
+            return
+
+        self._last_seen[user_id] = time.monotonic()
+        digest = _digest(serialized)
+        if self._stored.get(user_id) == digest:
+            return
+
+        self._stored[user_id] = digest
+        self._dirty[user_id] = serialized
+        if self._write_task is None:
+            self._write_task = asyncio.create_task(self._write_dirty())
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty.pop(user_id, None)
+        # Пакет в записи может содержать этого пользователя: удаляем после него
+        if self._write_task is not None:
+            await self._write_task
+        self._stored[user_id] = None
+        self._last_seen[user_id] = time.monotonic()
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM user_state WHERE user_id = ?", (user_id,))
+
+        conn.commit()
+        conn.close()
+
+    async def flush(self) -> None:
+        """Запись оставшихся изменений при остановке бота"""
+        if self._write_task is not None:
+            await self._write_task
+        if self._dirty:
+            batch, self._dirty = self._dirty, {}
+            self._write_batch(batch)
+
+    # Остальные виды данных бот не использует
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
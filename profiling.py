@@ -0,0 +1,231 @@
+"""Профилирование работающего бота по команде администратора.
+
+Profiler на заданное время включает:
+- семплирующий профилировщик: отдельный поток раз в interval снимает стеки всех
+  потоков (sys._current_frames) и копит их в формате collapsed stacks, который
+  понимают flamegraph.pl, speedscope и inferno;
+- трассировку SQL: sqlite3.connect временно создает соединения, замеряющие каждый execute;
+- трассировку обработчиков Telegram, обернутых через Profiler.trace.
+Вне окна профилирования обертки обработчиков сводятся к проверке одного флага,
+а sqlite3.connect не подменен.
+"""
+import functools
+import heapq
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Сколько самых медленных вызовов обработчиков хранить
+SLOW_HANDLERS_LIMIT = 20
+
+_original_connect = sqlite3.connect
+_active_profiler: Optional["Profiler"] = None
+
+
+class _TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - started)
+
+
+class _TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute создает курсор внутри C-кода, минуя cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _traced_connect(*args, **kwargs):
+    kwargs.setdefault("factory", _TracedConnection)
+    return _original_connect(*args, **kwargs)
+
+
+def _record_sql(sql: str, duration: float):
+    profiler = _active_profiler
+    if profiler is not None:
+        profiler.record_sql(sql, duration)
+
+
+def describe_update(update) -> str:
+    """Короткое описание обновления без текста пользователя"""
+    if getattr(update, "callback_query", None):
+        return update.callback_query.data or ""
+    message = getattr(update, "message", None)
+    text = message.text if message and message.text else ""
+    if text.startswith("/"):
+        return text.split(maxsplit=1)[0]
+    return "text"
+
+
+class ProfileReport:
+    """Результат окна профилирования"""
+
+    def __init__(self, duration: float, samples: int, stacks: Counter,
+                 sql: Dict[str, List[float]], slow_handlers: List[Tuple[float, str]]):
+        self.duration = duration
+        self.samples = samples
+        self.stacks = stacks
+        self.sql = sql
+        self.slow_handlers = slow_handlers
+
+    def save_collapsed(self, output_dir: str) -> str:
+        """Сохранение стеков в формате collapsed stacks для построения flamegraph"""
+        os.makedirs(output_dir, exist_ok=True)
+        filename = f"{output_dir}/profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.collapsed.txt"
+        with open(filename, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return filename
+
+    def top_functions(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Функции, на которых чаще всего останавливался семплер (собственное время)"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def top_sql(self, limit: int = 10) -> List[Tuple[str, List[float]]]:
+        """Запросы по суммарному времени выполнения: [количество, сумма, максимум]"""
+        return sorted(self.sql.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+
+    def summary(self, limit: int = 10) -> str:
+        lines = [f"🔬 Профилирование {self.duration:.0f} с, семплов: {self.samples}\n"]
+
+        lines.append("🔥 Горячие функции:")
+        for function, count in self.top_functions(limit):
+            lines.append(f"• {count / max(self.samples, 1):.0%} {function[:80]}")
+
+        lines.append("\n🐢 SQL по суммарному времени (кол-во / сумма / макс, мс):")
+        for sql, (count, total, longest) in self.top_sql(limit):
+            lines.append(f"• {int(count)} / {total * 1000:.1f} / {longest * 1000:.1f}: {sql[:80]}")
+
+        lines.append("\n⏱ Самые медленные обработчики, мс:")
+        for duration, name in self.slow_handlers[:limit]:
+            lines.append(f"• {duration * 1000:.1f}: {name}")
+
+        # Ограничение Telegram на длину сообщения
+        return "\n".join(lines)[:4000]
+
+
+class Profiler:
+    """Окно профилирования: семплирование стеков, SQL и обработчики"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.active = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reset()
+
+    def _reset(self):
+        self._started = 0.0
+        self._samples = 0
+        self._stacks = Counter()
+        self._sql: Dict[str, List[float]] = {}
+        self._slow_handlers: List[Tuple[float, str]] = []
+
+    def start(self):
+        global _active_profiler
+        if self.active:
+            raise RuntimeError("Профилирование уже запущено")
+
+        self._reset()
+        self._started = time.perf_counter()
+        self._stop.clear()
+        self.active = True
+        _active_profiler = self
+        sqlite3.connect = _traced_connect
+
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProfileReport:
+        global _active_profiler
+        self._stop.set()
+        self._thread.join()
+        sqlite3.connect = _original_connect
+        _active_profiler = None
+        self.active = False
+
+        with self._lock:
+            slow_handlers = sorted(self._slow_handlers, reverse=True)
+            return ProfileReport(
+                time.perf_counter() - self._started, self._samples, self._stacks, self._sql, slow_handlers
+            )
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        code_names: Dict[object, str] = {}
+
+        while not self._stop.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    name = code_names.get(code)
+                    if name is None:
+                        name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                        code_names[code] = name
+                    stack.append(name)
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    def record_sql(self, sql: str, duration: float):
+        # Запросы с разными параметрами и отступами сводятся в одну строку
+        key = re.sub(r'\s+', ' ', sql).strip()
+        with self._lock:
+            stats = self._sql.get(key)
+            if stats is None:
+                self._sql[key] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+
+    def record_handler(self, name: str, duration: float):
+        with self._lock:
+            if len(self._slow_handlers) < SLOW_HANDLERS_LIMIT:
+                heapq.heappush(self._slow_handlers, (duration, name))
+            elif duration > self._slow_handlers[0][0]:
+                heapq.heapreplace(self._slow_handlers, (duration, name))
+
+    def trace(self, name: str, callback):
+        """Обертка обработчика Telegram, замеряющая его длительность в окне профилирования"""
+        @functools.wraps(callback)
+        async def wrapper(update, context):
+            if not self.active:
+                return await callback(update, context)
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                self.record_handler(f"{name} {describe_update(update)}", time.perf_counter() - started)
+
+        return wrapper
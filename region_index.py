@@ -0,0 +1,412 @@
+"""Справочник регионов и нормализация названий, введенных пользователем.
+
+RegionIndex приводит ввод пользователя ("мск", "в Свердловской обл.", "Краснадар")
+к каноническому названию субъекта РФ или крупного города без обращения к внешним API:
+сначала точный поиск по словарю синонимов, затем нечеткий - по триграммам
+с проверкой расстоянием Левенштейна. Ввод, не похожий ни на один регион, отклоняется,
+чтобы не тратить платный запрос к OpenAI.
+
+В users.region хранится субъект РФ (RegionMatch.subject), а не город, чтобы статистика
+по регионам не делилась на "Казань" и "Республика Татарстан".
+
+Приведение уже сохраненных users.region к каноническим названиям субъектов:
+    python region_index.py backfill car_sales_bot.db
+В многопроцессном режиме (sharding.py) третьим аргументом передается число шардов:
+    python region_index.py backfill car_sales_bot.db 4
+"""
+import heapq
+import re
+import sqlite3
+import sys
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Субъекты РФ: каноническое название и синонимы.
+# Синоним без родового слова ("Свердловская" для "Свердловская область") добавляется автоматически
+SUBJECTS: List[Tuple[str, Tuple[str, ...]]] = [
+    # Города федерального значения
+    ("Москва", ("мск", "масква", "моск")),
+    ("Санкт-Петербург", ("спб", "питер", "петербург", "санкт петербург", "ленинград")),
+    ("Севастополь", ()),
+    # Республики
+    ("Республика Адыгея", ("адыгея",)),
+    ("Республика Алтай", ("алтай", "горный алтай")),
+    ("Республика Башкортостан", ("башкортостан", "башкирия")),
+    ("Республика Бурятия", ("бурятия",)),
+    ("Республика Дагестан", ("дагестан",)),
+    ("Республика Ингушетия", ("ингушетия",)),
+    ("Кабардино-Балкарская Республика", ("кабардино балкария", "кбр")),
+    ("Республика Калмыкия", ("калмыкия",)),
+    ("Карачаево-Черкесская Республика", ("карачаево черкесия", "кчр")),
+    ("Республика Карелия", ("карелия",)),
+    ("Республика Коми", ("коми",)),
+    ("Республика Крым", ("крым",)),
+    ("Республика Марий Эл", ("марий эл",)),
+    ("Республика Мордовия", ("мордовия",)),
+    ("Республика Саха (Якутия)", ("якутия", "саха")),
+    ("Республика Северная Осетия — Алания", ("северная осетия", "осетия", "алания")),
+    ("Республика Татарстан", ("татарстан", "татария", "рт")),
+    ("Республика Тыва", ("тыва", "тува")),
+    ("Удмуртская Республика", ("удмуртия",)),
+    ("Республика Хакасия", ("хакасия",)),
+    ("Чеченская Республика", ("чечня",)),
+    ("Чувашская Республика", ("чувашия",)),
+    # Края
+    ("Алтайский край", ()),
+    ("Забайкальский край", ("забайкалье",)),
+    ("Камчатский край", ("камчатка",)),
+    ("Краснодарский край", ("кубань",)),
+    ("Красноярский край", ()),
+    ("Пермский край", ("прикамье",)),
+    ("Приморский край", ("приморье",)),
+    ("Ставропольский край", ("ставрополье",)),
+    ("Хабаровский край", ()),
+    # Области
+    ("Амурская область", ("приамурье",)),
+    ("Архангельская область", ()),
+    ("Астраханская область", ()),
+    ("Белгородская область", ()),
+    ("Брянская область", ()),
+    ("Владимирская область", ()),
+    ("Волгоградская область", ()),
+    ("Вологодская область", ()),
+    ("Воронежская область", ()),
+    ("Ивановская область", ()),
+    ("Иркутская область", ()),
+    ("Калининградская область", ()),
+    ("Калужская область", ()),
+    ("Кемеровская область", ("кузбасс",)),
+    ("Кировская область", ()),
+    ("Костромская область", ()),
+    ("Курганская область", ()),
+    ("Курская область", ()),
+    ("Ленинградская область", ("ленобласть", "ло")),
+    ("Липецкая область", ()),
+    ("Магаданская область", ()),
+    ("Московская область", ("подмосковье", "мо")),
+    ("Мурманская область", ()),
+    ("Нижегородская область", ()),
+    ("Новгородская область", ()),
+    ("Новосибирская область", ()),
+    ("Омская область", ()),
+    ("Оренбургская область", ()),
+    ("Орловская область", ()),
+    ("Пензенская область", ()),
+    ("Псковская область", ()),
+    ("Ростовская область", ()),
+    ("Рязанская область", ()),
+    ("Самарская область", ()),
+    ("Саратовская область", ()),
+    ("Сахалинская область", ("сахалин",)),
+    ("Свердловская область", ()),
+    ("Смоленская область", ()),
+    ("Тамбовская область", ()),
+    ("Тверская область", ()),
+    ("Томская область", ()),
+    ("Тульская область", ()),
+    ("Тюменская область", ()),
+    ("Ульяновская область", ()),
+    ("Челябинская область", ()),
+    ("Ярославская область", ()),
+    # Автономии
+    ("Еврейская автономная область", ("еао",)),
+    ("Ненецкий автономный округ", ("нао",)),
+    ("Ханты-Мансийский автономный округ — Югра", ("хмао", "югра", "ханты мансийский")),
+    ("Чукотский автономный округ", ("чукотка",)),
+    ("Ямало-Ненецкий автономный округ", ("янао", "ямал")),
+]
+
+# Крупные города: название, субъект, синонимы
+CITIES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("Новосибирск", "Новосибирская область", ("нск", "новосиб")),
+    ("Екатеринбург", "Свердловская область", ("екб", "екат", "свердловск")),
+    ("Казань", "Республика Татарстан", ()),
+    ("Нижний Новгород", "Нижегородская область", ("нижний", "нн", "горький")),
+    ("Челябинск", "Челябинская область", ("челяба",)),
+    ("Самара", "Самарская область", ()),
+    ("Омск", "Омская область", ()),
+    ("Ростов-на-Дону", "Ростовская область", ("ростов", "ростов на дону")),
+    ("Уфа", "Республика Башкортостан", ()),
+    ("Красноярск", "Красноярский край", ("крск",)),
+    ("Воронеж", "Воронежская область", ()),
+    ("Пермь", "Пермский край", ()),
+    ("Волгоград", "Волгоградская область", ()),
+    ("Краснодар", "Краснодарский край", ("крд",)),
+    ("Саратов", "Саратовская область", ()),
+    ("Тюмень", "Тюменская область", ()),
+    ("Тольятти", "Самарская область", ()),
+    ("Ижевск", "Удмуртская Республика", ()),
+    ("Барнаул", "Алтайский край", ()),
+    ("Ульяновск", "Ульяновская область", ()),
+    ("Иркутск", "Иркутская область", ()),
+    ("Хабаровск", "Хабаровский край", ()),
+    ("Ярославль", "Ярославская область", ()),
+    ("Владивосток", "Приморский край", ("владик",)),
+    ("Махачкала", "Республика Дагестан", ()),
+    ("Томск", "Томская область", ()),
+    ("Оренбург", "Оренбургская область", ()),
+    ("Кемерово", "Кемеровская область", ()),
+    ("Новокузнецк", "Кемеровская область", ()),
+    ("Рязань", "Рязанская область", ()),
+    ("Набережные Челны", "Республика Татарстан", ("челны",)),
+    ("Астрахань", "Астраханская область", ()),
+    ("Пенза", "Пензенская область", ()),
+    ("Киров", "Кировская область", ()),
+    ("Липецк", "Липецкая область", ()),
+    ("Чебоксары", "Чувашская Республика", ()),
+    ("Калининград", "Калининградская область", ()),
+    ("Тула", "Тульская область", ()),
+    ("Курск", "Курская область", ()),
+    ("Ставрополь", "Ставропольский край", ()),
+    ("Сочи", "Краснодарский край", ()),
+    ("Улан-Удэ", "Республика Бурятия", ()),
+    ("Тверь", "Тверская область", ()),
+    ("Магнитогорск", "Челябинская область", ()),
+    ("Иваново", "Ивановская область", ()),
+    ("Брянск", "Брянская область", ()),
+    ("Белгород", "Белгородская область", ()),
+    ("Сургут", "Ханты-Мансийский автономный округ — Югра", ()),
+    ("Владимир", "Владимирская область", ()),
+    ("Архангельск", "Архангельская область", ()),
+    ("Чита", "Забайкальский край", ()),
+    ("Калуга", "Калужская область", ()),
+    ("Смоленск", "Смоленская область", ()),
+    ("Волжский", "Волгоградская область", ()),
+    ("Курган", "Курганская область", ()),
+    ("Череповец", "Вологодская область", ()),
+    ("Орёл", "Орловская область", ()),
+    ("Вологда", "Вологодская область", ()),
+    ("Саранск", "Республика Мордовия", ()),
+    ("Якутск", "Республика Саха (Якутия)", ()),
+    ("Мурманск", "Мурманская область", ()),
+    ("Владикавказ", "Республика Северная Осетия — Алания", ()),
+    ("Грозный", "Чеченская Республика", ()),
+    ("Тамбов", "Тамбовская область", ()),
+    ("Стерлитамак", "Республика Башкортостан", ()),
+    ("Кострома", "Костромская область", ()),
+    ("Петрозаводск", "Республика Карелия", ()),
+    ("Новороссийск", "Краснодарский край", ()),
+    ("Йошкар-Ола", "Республика Марий Эл", ()),
+    ("Таганрог", "Ростовская область", ()),
+    ("Сыктывкар", "Республика Коми", ()),
+    ("Нальчик", "Кабардино-Балкарская Республика", ()),
+    ("Нижневартовск", "Ханты-Мансийский автономный округ — Югра", ()),
+    ("Ханты-Мансийск", "Ханты-Мансийский автономный округ — Югра", ()),
+    ("Комсомольск-на-Амуре", "Хабаровский край", ()),
+    ("Братск", "Иркутская область", ()),
+    ("Благовещенск", "Амурская область", ()),
+    ("Великий Новгород", "Новгородская область", ("новгород",)),
+    ("Псков", "Псковская область", ()),
+    ("Старый Оскол", "Белгородская область", ()),
+    ("Симферополь", "Республика Крым", ()),
+    ("Южно-Сахалинск", "Сахалинская область", ()),
+    ("Петропавловск-Камчатский", "Камчатский край", ()),
+    ("Абакан", "Республика Хакасия", ()),
+    ("Норильск", "Красноярский край", ()),
+    ("Майкоп", "Республика Адыгея", ()),
+    ("Магадан", "Магаданская область", ()),
+    ("Кызыл", "Республика Тыва", ()),
+    ("Элиста", "Республика Калмыкия", ()),
+    ("Биробиджан", "Еврейская автономная область", ()),
+    ("Салехард", "Ямало-Ненецкий автономный округ", ()),
+    ("Нарьян-Мар", "Ненецкий автономный округ", ()),
+    ("Анадырь", "Чукотский автономный округ", ()),
+    ("Горно-Алтайск", "Республика Алтай", ()),
+    ("Черкесск", "Карачаево-Черкесская Республика", ()),
+    ("Магас", "Республика Ингушетия", ()),
+]
+
+# Родовые слова, без которых название субъекта тоже считается синонимом
+GENERIC_WORDS = {"республика", "край", "область", "автономный", "автономная", "округ"}
+# Сокращения во вводе пользователя
+ABBREVIATIONS = {"обл": "область", "респ": "республика", "кр": "край", "ао": "автономный округ"}
+# Служебные слова, которые отбрасываются: "г. Казань", "в Москве", "регион Кубань"
+STOP_WORDS = {"г", "гор", "город", "в", "во", "из", "регион", "рф", "россия"}
+
+# Минимальное сходство для нечеткого совпадения (1 - расстояние / длина)
+MIN_SIMILARITY = 0.72
+# Сколько лучших кандидатов по триграммам проверять расстоянием Левенштейна
+FUZZY_CANDIDATES = 5
+MAX_INPUT_LENGTH = 60
+# Сколько последних разных вводов помнит кэш RegionIndex.resolve
+RESOLVE_CACHE_SIZE = 4096
+
+
+class RegionMatch(NamedTuple):
+    name: str
+    subject: str
+    score: float
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, без пунктуации, сокращений и служебных слов"""
+    words = re.sub(r'[^\w]+', ' ', text.lower().replace('ё', 'е')).split()
+    words = [ABBREVIATIONS.get(word, word) for word in words if word not in STOP_WORDS]
+    return " ".join(words)
+
+
+def _trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _pattern_masks(pattern: str) -> Dict[str, int]:
+    """Битовые маски позиций символов шаблона для _edit_distance"""
+    masks: Dict[str, int] = {}
+    for i, c in enumerate(pattern):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def _edit_distance(pattern: str, masks: Dict[str, int], text: str) -> int:
+    """Расстояние Левенштейна битово-параллельным алгоритмом Майерса (Хиирё).
+
+    Один проход по text с целочисленными операциями над маской длины pattern -
+    на порядок быстрее таблицы динамического программирования в Python.
+    """
+    if not pattern:
+        return len(text)
+
+    mask = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    pv, mv, score = mask, 0, len(pattern)
+    for c in text:
+        eq = masks.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+
+class RegionIndex:
+    """Словарь синонимов и триграммный индекс по ним"""
+
+    def __init__(self):
+        # Нормализованный синоним -> (каноническое название, субъект)
+        self.aliases: Dict[str, Tuple[str, str]] = {}
+        for name, aliases in SUBJECTS:
+            self._add(name, name, aliases)
+            generic_free = " ".join(w for w in normalize(name).split() if w not in GENERIC_WORDS)
+            self._add(name, name, (generic_free,))
+        for name, subject, aliases in CITIES:
+            self._add(name, subject, aliases)
+
+        self._alias_list = list(self.aliases)
+        self._alias_masks = [_pattern_masks(alias) for alias in self._alias_list]
+        self._alias_trigrams = [len(set(_trigrams(alias))) for alias in self._alias_list]
+        self._postings: Dict[str, List[int]] = {}
+        for alias_id, alias in enumerate(self._alias_list):
+            for trigram in set(_trigrams(alias)):
+                self._postings.setdefault(trigram, []).append(alias_id)
+
+        # Кэш повторяющихся вводов - свой у каждого индекса
+        self._resolve_cached = lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._resolve_normalized)
+
+    def _add(self, name: str, subject: str, aliases: Tuple[str, ...]):
+        for alias in (name,) + tuple(aliases):
+            normalized = normalize(alias)
+            if normalized:
+                # Первое вхождение важнее: субъект не перекрывается одноименным городом
+                self.aliases.setdefault(normalized, (name, subject))
+
+    def resolve(self, text: str) -> Optional[RegionMatch]:
+        """Каноническое название региона или None, если ввод не похож на регион"""
+        if not text or len(text) > MAX_INPUT_LENGTH:
+            return None
+        return self._resolve_cached(normalize(text))
+
+    def _resolve_normalized(self, query: str) -> Optional[RegionMatch]:
+        if not query:
+            return None
+
+        exact = self.aliases.get(query)
+        if exact:
+            return RegionMatch(exact[0], exact[1], 1.0)
+
+        if len(query) < 4:
+            return None
+
+        trigrams = set(_trigrams(query))
+        shared: Dict[int, int] = {}
+        for trigram in trigrams:
+            for alias_id in self._postings.get(trigram, ()):
+                shared[alias_id] = shared.get(alias_id, 0) + 1
+        if not shared:
+            return None
+
+        # Кандидаты по коэффициенту Дайса: доля общих триграмм
+        query_size = len(trigrams)
+        candidates = heapq.nlargest(
+            FUZZY_CANDIDATES, shared,
+            key=lambda alias_id: shared[alias_id] / (query_size + self._alias_trigrams[alias_id])
+        )
+
+        best_alias, best_score = None, 0.0
+        for alias_id in candidates:
+            alias = self._alias_list[alias_id]
+            length = max(len(alias), len(query))
+            score = 1 - _edit_distance(alias, self._alias_masks[alias_id], query) / length
+            # Начало названия: "новосиб", "екатерин"
+            if len(query) >= 5 and alias.startswith(query):
+                score = max(score, 0.9)
+            if score > best_score:
+                best_alias, best_score = alias, score
+
+        if best_score < MIN_SIMILARITY:
+            return None
+        name, subject = self.aliases[best_alias]
+        return RegionMatch(name, subject, best_score)
+
+
+def backfill_user_regions(db_path: str, index: Optional[RegionIndex] = None) -> Tuple[int, int]:
+    """Замена users.region на канонические названия субъектов РФ (города - на свой субъект).
+
+    Каждое уникальное значение распознается один раз. Возвращает количество
+    обновленных пользователей и количество нераспознанных значений (они не меняются).
+    """
+    index = index or RegionIndex()
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT region, COUNT(*) FROM users WHERE region IS NOT NULL GROUP BY region")
+    updates = []
+    updated_users = 0
+    unresolved = 0
+    for region, user_count in cursor.fetchall():
+        match = index.resolve(region)
+        if match is None:
+            unresolved += 1
+        elif match.subject != region:
+            updates.append((match.subject, region))
+            updated_users += user_count
+
+    cursor.executemany("UPDATE users SET region = ? WHERE region = ?", updates)
+
+    conn.commit()
+    conn.close()
+    return updated_users, unresolved
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        from database import shard_db_path
+
+        path = sys.argv[2] if len(sys.argv) > 2 else "car_sales_bot.db"
+        shard_count = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        region_index = RegionIndex()
+        for db_path in [shard_db_path(path, i) for i in range(shard_count)] or [path]:
+            updated, unresolved = backfill_user_regions(db_path, region_index)
+            print(f"{db_path}: обновлено пользователей: {updated}, нераспознанных значений: {unresolved}")
+    else:
+        region_index = RegionIndex()
+        for arg in sys.argv[1:]:
+            print(f"{arg!r} -> {region_index.resolve(arg)}")
@@ -0,0 +1,119 @@
+"""Бенчмарк масштабирования многопроцессного режима.
+
+Прогоняет одинаковый поток синтетических обновлений через ShardRouter
+при разном числе процессов-обработчиков. Каждый обработчик делает
+CPU-тяжелую часть реального сценария: разбор JSON обновления,
+рендер персонального PDF и сериализацию ответа.
+
+Пример запуска:
+    python shard_benchmark.py --updates 400 --workers 1 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from sharding import ShardRouter, update_user_id
+
+INTERESTS = [
+    {'type': 'car_interest', 'details': 'Общий интерес к автомобилям'},
+    {'type': 'region_analysis', 'details': 'Москва'},
+    {'type': 'offer_request', 'details': 'Запрос коммерческого предложения'},
+]
+
+
+def synthetic_update(update_id: int, user_id: int) -> bytes:
+    return json.dumps({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Тест'},
+            'chat_instance': str(user_id),
+            'data': 'get_offer',
+        }
+    }).encode()
+
+
+def bench_worker(queue, done, output_dir: str):
+    """Обработчик бенчмарка: та же очередь, что в sharding.run_worker, но без Telegram"""
+    from pdf_generator import PDFGenerator
+
+    pdf_gen = PDFGenerator(output_dir)
+    processed = 0
+    while True:
+        body = queue.get()
+        if body is None:
+            break
+        data = json.loads(body)
+        user_id = update_user_id(data)
+        path = pdf_gen.generate_offer(user_id, [], INTERESTS)
+        json.dumps({'chat_id': user_id, 'document': path, 'update': data})
+        processed += 1
+    done.put(processed)
+
+
+def run(worker_count: int, updates: int, users: int, output_dir: str) -> float:
+    """Время обработки всех обновлений при заданном числе обработчиков, секунды"""
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(worker_count)]
+    done = ctx.Queue()
+    workers = [
+        ctx.Process(target=bench_worker, args=(queue, done, os.path.join(output_dir, f"shard{shard}")))
+        for shard, queue in enumerate(queues)
+    ]
+    for worker in workers:
+        worker.start()
+
+    rng = random.Random(42)
+    bodies = [synthetic_update(i, rng.randrange(100_000_000, 100_000_000 + users)) for i in range(updates)]
+    router = ShardRouter(queues)
+
+    # Прогрев: процессы успевают импортировать reportlab до начала замера
+    for queue in queues:
+        queue.put(synthetic_update(0, 1))
+    time.sleep(2)
+
+    started = time.perf_counter()
+    for body in bodies:
+        router.route(body)
+    for queue in queues:
+        queue.put(None)
+
+    processed = sum(done.get() for _ in workers)
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+
+    assert processed == updates + worker_count
+    return elapsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Масштабирование многопроцессного режима")
+    parser.add_argument("--updates", type=int, default=400)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output_dir = tempfile.mkdtemp(prefix="carsales_shards_")
+    print(f"Процессоров: {os.cpu_count()}, обновлений: {args.updates}")
+    print(f"{'обработчиков':>14}{'время, с':>10}{'обн./с':>10}{'ускорение':>11}{'эффективность':>15}")
+
+    baseline = None
+    for worker_count in args.workers:
+        elapsed = run(worker_count, args.updates, args.users, output_dir)
+        throughput = args.updates / elapsed
+        baseline = baseline or throughput
+        speedup = throughput / baseline
+        print(f"{worker_count:>14}{elapsed:>10.2f}{throughput:>10.1f}{speedup:>11.2f}"
+              f"{speedup / worker_count * args.workers[0]:>15.0%}")
+
+
+if __name__ == "__main__":
+    main()
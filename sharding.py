@@ -0,0 +1,265 @@
+"""Многопроцессный запуск бота с привязкой пользователей к процессам.
+
+Процесс-диспетчер принимает вебхук Telegram и по user_id отправляет обновление
+в один из WORKER_COUNT процессов-обработчиков. Все обновления пользователя попадают
+в один и тот же процесс, поэтому его context.user_data живет локально, а записи
+в базу идут в собственный файл шарда (database.shard_db_path) без конкуренции
+за блокировку. Запросы администратора опрашивают снимки всех шардов, а выгрузка
+строится по их объединению (ShardedExporter). /profile профилирует только
+процесс, которому достался администратор.
+
+Запуск:
+    python sharding.py
+
+Обслуживающие команды работают с файлом базы, поэтому в этом режиме им передается
+число шардов, и они обходят car_sales_bot.shard0.db ... car_sales_bot.shard{N-1}.db:
+    python lead_scoring.py car_sales_bot.db 4
+    python region_index.py backfill car_sales_bot.db 4
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+from typing import List, Optional
+
+from aiohttp import web
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from config import (
+    BOT_TOKEN, DB_PATH, EXPORT_DIR, PERSISTENCE_UPDATE_INTERVAL,
+    SNAPSHOT_PATH, SNAPSHOT_INTERVAL, SNAPSHOT_PAGES_PER_STEP, SNAPSHOT_STEP_SLEEP,
+    BACKUP_DIR, BACKUP_EVERY, BACKUP_KEEP,
+    WORKER_COUNT, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN
+)
+from backup import SnapshotManager
+from database import ShardedDatabaseManager, shard_db_path, shard_for_user
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, которые сливаются из снимков шардов: None - строки переносятся целиком
+# (ключ уникален), иначе - перечисленные столбцы без id
+MERGED_TABLES = {
+    "users": None,
+    "user_messages": "user_id, message_text, message_type, timestamp",
+    "user_interests": "user_id, interest_type, interest_details, interest_level, timestamp",
+    "sent_offers": "user_id, offer_type, offer_file_path, sent_status, opened_at, response_received, sent_at",
+    "regions": None,
+}
+
+# Поля обновления, в которых Telegram передает автора в ключе "from"
+UPDATE_FIELDS_WITH_SENDER = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def update_user_id(data: dict) -> Optional[int]:
+    """user_id автора обновления без разбора его в объекты telegram"""
+    for field in UPDATE_FIELDS_WITH_SENDER:
+        payload = data.get(field)
+        if payload and "from" in payload:
+            return payload["from"]["id"]
+
+    poll_answer = data.get("poll_answer")
+    if poll_answer and "user" in poll_answer:
+        return poll_answer["user"]["id"]
+
+    return None
+
+
+class ShardRouter:
+    """Распределение обновлений по очередям процессов-обработчиков"""
+
+    def __init__(self, queues: List[multiprocessing.Queue]):
+        self.queues = queues
+
+    def route(self, body: bytes) -> int:
+        """Отправка обновления в очередь его шарда. Возвращает номер шарда"""
+        user_id = update_user_id(json.loads(body))
+        # Обновления без автора (например, опросы канала) обрабатывает нулевой шард
+        shard = shard_for_user(user_id, len(self.queues)) if user_id is not None else 0
+        self.queues[shard].put_nowait(body)
+        return shard
+
+
+def merge_snapshots(snapshot_paths: List[str], target_path: str) -> str:
+    """Объединение снимков шардов в одну базу для выгрузок, рассчитанных на одну базу.
+
+    Пользователи в шардах не пересекаются; id строк с AUTOINCREMENT назначаются заново.
+    """
+    tmp_path = f"{target_path}.tmp"
+    shutil.copyfile(snapshot_paths[0], tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # Полнотекстовый индекс объединенной базе не нужен: триггеры только замедлят вставку
+        triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for (trigger,) in triggers:
+            conn.execute(f"DROP TRIGGER {trigger}")
+
+        for path in snapshot_paths[1:]:
+            conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            for table, columns in MERGED_TABLES.items():
+                if columns is None:
+                    conn.execute(f"INSERT OR REPLACE INTO {table} SELECT * FROM shard.{table}")
+                else:
+                    conn.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM shard.{table}")
+            conn.commit()
+            conn.execute("DETACH DATABASE shard")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, target_path)
+    return target_path
+
+
+class ShardedExporter:
+    """Выгрузка в многопроцессном режиме: AnalyticsExporter по объединению снимков всех шардов"""
+
+    def __init__(self, snapshot_paths: List[str], merged_path: str, export_dir: str):
+        self.snapshot_paths = snapshot_paths
+        self.merged_path = merged_path
+        self.export_dir = export_dir
+        # Выгрузка идет в потоке (asyncio.to_thread), две одновременные не должны сливать в один файл
+        self._lock = threading.Lock()
+        self._merged_generation = None
+
+    def _snapshot_generation(self) -> tuple:
+        """Время изменения снимков: SnapshotManager заменяет файл целиком при каждом обновлении"""
+        return tuple(os.stat(path).st_mtime_ns for path in self.snapshot_paths)
+
+    def export_complete_report(self) -> Optional[str]:
+        from analytics import AnalyticsExporter
+
+        with self._lock:
+            # Пока снимки не обновились, повторная выгрузка берет уже объединенную базу
+            generation = self._snapshot_generation()
+            if generation != self._merged_generation or not os.path.exists(self.merged_path):
+                merge_snapshots(self.snapshot_paths, self.merged_path)
+                self._merged_generation = generation
+            return AnalyticsExporter(self.merged_path, self.export_dir).export_complete_report()
+
+
+def shard_snapshots(shard: int) -> SnapshotManager:
+    """Снимок и резервные копии базы шарда; обновляет их процесс-обработчик этого шарда"""
+    return SnapshotManager(
+        shard_db_path(DB_PATH, shard), shard_db_path(SNAPSHOT_PATH, shard),
+        SNAPSHOT_INTERVAL, SNAPSHOT_PAGES_PER_STEP, SNAPSHOT_STEP_SLEEP,
+        BACKUP_DIR, BACKUP_EVERY, BACKUP_KEEP
+    )
+
+
+async def _serve_worker(shard: int, shard_count: int, queue: multiprocessing.Queue):
+    # Импорт здесь, чтобы диспетчер не создавал CarSalesBot и его зависимости
+    from main import CarSalesBot, register_handlers
+    from persistence import SQLitePersistence
+
+    db = ShardedDatabaseManager(DB_PATH, shard_count)
+    # Запросы администратора и выгрузки читают снимки всех шардов
+    snapshot_paths = [shard_db_path(SNAPSHOT_PATH, i) for i in range(shard_count)]
+    root, ext = os.path.splitext(shard_db_path(SNAPSHOT_PATH, shard))
+    exporter = ShardedExporter(snapshot_paths, f"{root}.merged{ext}", EXPORT_DIR)
+    bot = CarSalesBot(
+        db, ShardedDatabaseManager(SNAPSHOT_PATH, shard_count, read_only=True), exporter, shard
+    )
+    snapshots = shard_snapshots(shard)
+    snapshots.start()
+    persistence = SQLitePersistence(
+        shard_db_path(DB_PATH, shard), update_interval=PERSISTENCE_UPDATE_INTERVAL
+    )
+    # Updater не нужен: обновления приходят от диспетчера
+    application = Application.builder().token(BOT_TOKEN).updater(None).persistence(persistence).build()
+    register_handlers(application, bot)
+
+    loop = asyncio.get_running_loop()
+    async with application:
+        await application.start()
+        logger.info(f"Обработчик {shard} запущен")
+
+        while True:
+            body = await loop.run_in_executor(None, queue.get)
+            if body is None:
+                break
+            update = Update.de_json(json.loads(body), application.bot)
+            await application.update_queue.put(update)
+
+        await application.stop()
+    snapshots.stop()
+
+
+def run_worker(shard: int, shard_count: int, queue: multiprocessing.Queue):
+    """Точка входа процесса-обработчика"""
+    logging.basicConfig(
+        format=f'%(asctime)s - shard{shard} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    asyncio.run(_serve_worker(shard, shard_count, queue))
+
+
+def build_dispatcher(router: ShardRouter) -> web.Application:
+    """HTTP-приложение, принимающее вебхук Telegram"""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET_TOKEN and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET_TOKEN:
+            return web.Response(status=403)
+
+        body = await request.read()
+        try:
+            router.route(body)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Некорректное обновление: {e}")
+        # Telegram повторяет доставку при любом ответе, кроме 2xx
+        return web.Response()
+
+    async def set_webhook(app: web.Application):
+        async with Bot(BOT_TOKEN) as bot:
+            await bot.set_webhook(
+                url=WEBHOOK_URL + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET_TOKEN or None,
+                allowed_updates=Update.ALL_TYPES
+            )
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.on_startup.append(set_webhook)
+    return app
+
+
+def main():
+    """Запуск диспетчера и процессов-обработчиков"""
+    logging.basicConfig(
+        format='%(asctime)s - dispatcher - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    # Базы шардов и первые снимки создаются до запуска обработчиков: запросы администратора
+    # в любом процессе читают снимки всех шардов, и они должны существовать сразу
+    ShardedDatabaseManager(DB_PATH, WORKER_COUNT)
+    for shard in range(WORKER_COUNT):
+        shard_snapshots(shard).refresh()
+
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(WORKER_COUNT)]
+    workers = [
+        ctx.Process(target=run_worker, args=(shard, WORKER_COUNT, queue), name=f"shard{shard}")
+        for shard, queue in enumerate(queues)
+    ]
+    for worker in workers:
+        worker.start()
+
+    print(f"Бот запущен: {WORKER_COUNT} обработчиков")
+    try:
+        web.run_app(build_dispatcher(ShardRouter(queues)), host=WEBHOOK_LISTEN, port=WEBHOOK_PORT)
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
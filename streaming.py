@@ -0,0 +1,226 @@
+"""Потоковый вывод ответа OpenAI в сообщение Telegram.
+
+PartialJSONParser разбирает JSON по мере поступления фрагментов и в любой момент
+может вернуть уже полученную часть объекта: готовые элементы списков и поля,
+включая еще не дописанную строку. ThrottledMessageEditor обновляет сообщение
+не чаще заданного интервала, чтобы не упираться в лимиты Telegram на edit_text.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Telegram на длину текста сообщения
+MAX_MESSAGE_LENGTH = 4096
+
+
+class PartialJSONParser:
+    """Инкрементальный разбор JSON-объекта из потока текста.
+
+    Парсер за один проход по каждому фрагменту отслеживает вложенность и запоминает
+    последнюю позицию, после которой префикс можно закрыть скобками и получить
+    корректный JSON. Текст до первой "{" (например, ```json от модели) пропускается.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        # Стек контейнеров: [тип, фаза]; фазы объекта: key, colon, value, comma; массива: value, comma
+        self._stack: List[List[str]] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._unicode_left = 0
+        self._string_safe = 0
+        self._in_scalar = False
+        self._safe_end = 0
+        self._safe_closers = ""
+        # Последний успешно разобранный вариант - на случай испорченного продолжения
+        self._last_good: Optional[Dict] = None
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    def _text(self) -> str:
+        if len(self._buffer) > 1:
+            self._buffer = ["".join(self._buffer)]
+        return self._buffer[0] if self._buffer else ""
+
+    def _closers(self) -> str:
+        return "".join("}" if kind == "{" else "]" for kind, _ in reversed(self._stack))
+
+    def _mark_safe(self, end: int):
+        self._safe_end = end
+        self._safe_closers = self._closers()
+
+    def _value_done(self, end: int):
+        if not self._stack:
+            self._end = end
+            return
+        self._stack[-1][1] = "comma"
+        self._mark_safe(end)
+
+    def feed(self, chunk: str):
+        """Добавление очередного фрагмента ответа"""
+        if self.complete or not chunk:
+            return
+        self._buffer.append(chunk)
+        text = self._text()
+
+        for i in range(self._pos, len(text)):
+            c = text[i]
+
+            if self._start is None:
+                if c == "{":
+                    self._start = i
+                    self._stack.append(["{", "key"])
+                    self._mark_safe(i + 1)
+                continue
+
+            if self._in_string:
+                if self._unicode_left:
+                    self._unicode_left -= 1
+                    if not self._unicode_left:
+                        self._string_safe = i + 1
+                elif self._escape:
+                    self._escape = False
+                    if c == "u":
+                        self._unicode_left = 4
+                    else:
+                        self._string_safe = i + 1
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._stack[-1][1] = "colon"
+                    else:
+                        self._value_done(i + 1)
+                else:
+                    self._string_safe = i + 1
+                continue
+
+            if self._in_scalar:
+                if c in ",}] \t\r\n":
+                    self._in_scalar = False
+                    self._value_done(i)
+                else:
+                    continue
+
+            if c in " \t\r\n":
+                continue
+            if c == "{" or c == "[":
+                self._stack.append([c, "key" if c == "{" else "value"])
+                self._mark_safe(i + 1)
+            elif c == "}" or c == "]":
+                self._stack.pop()
+                self._value_done(i + 1)
+            elif c == '"':
+                self._in_string = True
+                self._string_is_key = self._stack[-1] == ["{", "key"]
+                self._string_safe = i + 1
+            elif c == ":":
+                self._stack[-1][1] = "value"
+            elif c == ",":
+                self._stack[-1][1] = "key" if self._stack[-1][0] == "{" else "value"
+            else:
+                self._in_scalar = True
+
+            if self.complete:
+                break
+
+        self._pos = len(text)
+
+    def snapshot(self) -> Optional[Dict]:
+        """Уже полученная часть объекта или None, если разбирать пока нечего"""
+        if self._start is None:
+            return self._last_good
+        text = self._text()
+
+        candidates = []
+        if self._in_string and not self._string_is_key and self._stack[-1][0] == "{":
+            # Недописанное текстовое поле (не элемент списка): обрезаем по последнему целому символу
+            candidates.append(text[self._start:self._string_safe] + '"' + self._closers())
+        candidates.append(text[self._start:self._safe_end] + self._safe_closers)
+
+        for candidate in candidates:
+            try:
+                value = json.loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                self._last_good = value
+                return value
+        return self._last_good
+
+    def result(self) -> Optional[Dict]:
+        """Итоговый объект; если ответ оборван или испорчен - то, что удалось разобрать"""
+        if self.complete:
+            try:
+                value = json.loads(self._text()[self._start:self._end])
+                if isinstance(value, dict):
+                    return value
+            except ValueError:
+                pass
+        return self.snapshot()
+
+
+class ThrottledMessageEditor:
+    """Редактирование сообщения не чаще одного раза в min_interval секунд"""
+
+    def __init__(self, message, min_interval: float):
+        self.message = message
+        self.min_interval = min_interval
+        self._next_edit = 0.0
+        self._last_text: Optional[str] = None
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self._next_edit
+
+    async def edit(self, text: str, final: bool = False):
+        """Промежуточные правки пропускаются, если интервал не истек; итоговая дожидается его.
+
+        Итоговая правка, которую не удалось выполнить, завершается исключением.
+        """
+        text = text[:MAX_MESSAGE_LENGTH]
+        if text == self._last_text:
+            return
+
+        retry_after = None
+        for _ in range(3):
+            wait = self._next_edit - time.monotonic()
+            if wait > 0:
+                if not final:
+                    return
+                await asyncio.sleep(wait)
+
+            try:
+                await self.message.edit_text(text)
+            except RetryAfter as e:
+                logger.warning(f"Лимит редактирования сообщений, пауза {e.retry_after} с")
+                self._next_edit = time.monotonic() + e.retry_after
+                retry_after = e
+                continue
+            except BadRequest as e:
+                # Текст мог совпасть с уже показанным после форматирования
+                if "not modified" not in str(e).lower():
+                    if final:
+                        raise
+                    logger.warning(f"Не удалось обновить сообщение: {e}")
+                    return
+
+            self._last_text = text
+            self._next_edit = time.monotonic() + self.min_interval
+            return
+
+        logger.warning("Сообщение не обновлено: лимит редактирования не снят после трех попыток")
+        if final:
+            raise retry_after
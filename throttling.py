@@ -0,0 +1,64 @@
+"""Ограничение частоты запросов (антифлуд).
+
+Token bucket в форме GCRA (generic cell rate algorithm): вместо пары
+"токены + время последнего пополнения" на ключ хранится одно число -
+момент, когда ведро снова станет полным. Проверка - одно обращение к dict
+и несколько арифметических операций, то есть единицы микросекунд.
+Пользователи с полным ведром периодически удаляются из памяти.
+"""
+import time
+from typing import Dict, Optional
+
+# Как часто удалять из памяти пользователей с полным ведром, секунды
+SWEEP_INTERVAL = 60.0
+
+
+class Throttler:
+    """Персональные и общее ведра с разной стоимостью действий.
+
+    rate - сколько токенов в секунду восполняется, burst - емкость ведра.
+    Действие стоимостью cost проходит, только если хватает токенов
+    и в ведре пользователя, и в общем ведре; иначе не списывается ничего.
+    """
+
+    def __init__(self, user_rate: float, user_burst: float, global_rate: float, global_burst: float,
+                 costs: Optional[Dict[str, float]] = None, default_cost: float = 1.0):
+        self.user_interval = 1.0 / user_rate
+        self.user_tolerance = user_burst * self.user_interval
+        self.global_interval = 1.0 / global_rate
+        self.global_tolerance = global_burst * self.global_interval
+        self.costs = costs or {}
+        self.default_cost = default_cost
+
+        # user_id -> момент, когда ведро пользователя снова полное (time.monotonic)
+        self._users: Dict[int, float] = {}
+        self._global = 0.0
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    def allow(self, user_id: int, action: str, now: Optional[float] = None) -> bool:
+        """Списание стоимости действия. False - запрос нужно отбросить"""
+        if now is None:
+            now = time.monotonic()
+        cost = self.costs.get(action, self.default_cost)
+
+        user_full_at = max(self._users.get(user_id, now), now) + cost * self.user_interval
+        if user_full_at - now > self.user_tolerance:
+            return False
+
+        global_full_at = max(self._global, now) + cost * self.global_interval
+        if global_full_at - now > self.global_tolerance:
+            return False
+
+        self._users[user_id] = user_full_at
+        self._global = global_full_at
+
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return True
+
+    def _sweep(self, now: float):
+        self._users = {user_id: full_at for user_id, full_at in self._users.items() if full_at > now}
+        self._next_sweep = now + SWEEP_INTERVAL
+
+    def __len__(self) -> int:
+        return len(self._users)
@@ -1,13 +1,23 @@
 import sqlite3
 from datetime import datetime, timedelta
+from typing import Dict
+
+from database import connect_read_only
 
 class Analytics:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, read_only: bool = False):
         self.db_path = db_path
+        # Только чтение - для снимка базы (backup.SnapshotManager), чтобы отчеты не мешали записи
+        self.read_only = read_only
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            return connect_read_only(self.db_path)
+        return sqlite3.connect(self.db_path)
     
     def get_regional_stats(self):
         """Статистика по регионам"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -22,7 +32,7 @@ class Analytics:
     
     def get_offer_stats(self):
         """Статистика отправленных предложений"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -38,12 +48,13 @@ class Analytics:
 class RegionManager:
     """Управление регионами и анализом"""
     
-    def __init__(self):
+    def __init__(self, db_path: str = "car_sales_bot.db"):
+        self.db_path = db_path
         self.analyzed_regions = {}
     
     def add_region_analysis(self, region: str, analysis: Dict):
         """Добавление анализа региона в базу"""
-        conn = sqlite3.connect("car_sales_bot.db")
+        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''